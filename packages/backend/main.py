@@ -8,6 +8,9 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 from utils.limiter import limiter
+from utils.retry import RetryMetrics
+from utils.http_client import HttpClient
+from utils.scratch import ScratchSpace
 load_dotenv()
 
 from fastapi import FastAPI, APIRouter, Request, HTTPException
@@ -46,6 +49,16 @@ app.include_router(linkedin.router, prefix="/linkedin")
 app.include_router(threads.router, prefix="/threads")
 app.include_router(publish.router, prefix="/publish")
 
+@app.on_event("startup")
+def sweep_scratch():
+    # Remove post directories left behind by a previous crash
+    ScratchSpace.sweep()
+
+@app.on_event("shutdown")
+async def close_http_client():
+    # Drain the pooled platform API connections
+    await HttpClient.close()
+
 
 
 @app.get("/")
@@ -64,6 +77,18 @@ async def disconnect(request: Request,platform: str, user_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
+@app.get("/metrics/retries")
+@limiter.limit("10/minute")
+async def retry_metrics(request: Request):
+    # Retry counts and time spent waiting, per platform operation
+    return RetryMetrics.snapshot()
+
+@app.get("/metrics/scratch")
+@limiter.limit("10/minute")
+async def scratch_metrics(request: Request):
+    # Disk used by the working directories of posts in progress
+    return ScratchSpace.total_usage()
+
 @app.get("/accounts/{user_id}")
 @limiter.limit("10/minute")
 async def get_connected_accounts(request: Request,user_id: str):
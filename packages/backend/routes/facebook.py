@@ -1,5 +1,6 @@
 import os
 import requests
+from utils.deadline import SYNC_REQUEST_TIMEOUT
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import RedirectResponse
 from utils.db_client import UserManager
@@ -79,7 +80,7 @@ async def facebook_callback(request: Request, code: str, state: str):
             "redirect_uri": REDIRECT_URI,
             "code": code
         }
-        res = requests.get(token_url, params=token_params).json()
+        res = requests.get(token_url, params=token_params, timeout=SYNC_REQUEST_TIMEOUT).json()
         short_token = res.get("access_token")
         
         if not short_token:
@@ -93,7 +94,7 @@ async def facebook_callback(request: Request, code: str, state: str):
             "client_secret": CLIENT_SECRET,
             "fb_exchange_token": short_token
         }
-        ll_res = requests.get(ll_url, params=ll_params).json()
+        ll_res = requests.get(ll_url, params=ll_params, timeout=SYNC_REQUEST_TIMEOUT).json()
         user_access_token = ll_res.get("access_token")
 
         # 3. Get Pages (and linked IG accounts)
@@ -101,7 +102,7 @@ async def facebook_callback(request: Request, code: str, state: str):
         accounts_res = requests.get(accounts_url, params={
             "fields": "name,access_token,instagram_business_account",
             "access_token": user_access_token
-        }).json()
+        }, timeout=SYNC_REQUEST_TIMEOUT).json()
 
         saved_accounts = []
 
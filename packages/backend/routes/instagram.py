@@ -2,6 +2,7 @@ from fastapi import APIRouter, Query, HTTPException, File, UploadFile, Form, Bac
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.responses import RedirectResponse, JSONResponse
 import requests
+from utils.deadline import SYNC_REQUEST_TIMEOUT
 import os
 import urllib.parse
 import uuid 
@@ -108,7 +109,7 @@ async def instagram_callback(request: Request, code: str = None, state: str = No
             "grant_type": "authorization_code",
             "code": code
         }
-        short_res = requests.get(token_url, params=token_params).json()
+        short_res = requests.get(token_url, params=token_params, timeout=SYNC_REQUEST_TIMEOUT).json()
         short_token = short_res.get("access_token")
 
         if not short_token:
@@ -122,7 +123,7 @@ async def instagram_callback(request: Request, code: str = None, state: str = No
             "client_secret": CLIENT_SECRET,
             "fb_exchange_token": short_token
         }
-        ll_res = requests.get(ll_url, params=ll_params).json()
+        ll_res = requests.get(ll_url, params=ll_params, timeout=SYNC_REQUEST_TIMEOUT).json()
         user_access_token = ll_res.get("access_token")
 
         # 3. Get Pages and their linked Instagram Business IDs
@@ -130,7 +131,7 @@ async def instagram_callback(request: Request, code: str = None, state: str = No
         accounts_res = requests.get(accounts_url, params={
             "fields": "name,access_token,instagram_business_account",
             "access_token": user_access_token
-        }).json()
+        }, timeout=SYNC_REQUEST_TIMEOUT).json()
 
         saved_accounts = []
 
@@ -191,7 +192,7 @@ async def process_and_publish_reel(request: Request, creation_id, instagram_id,
         status_data = requests.get(status_url, params={
             "fields": "status_code,status",
             "access_token": access_token
-        }).json()
+        }, timeout=SYNC_REQUEST_TIMEOUT).json()
 
         print(f"DEBUG Background Status (Attempt {i+1}): {status_data}")
 
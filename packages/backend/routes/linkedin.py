@@ -1,5 +1,6 @@
 import os
 import requests
+from utils.deadline import SYNC_REQUEST_TIMEOUT
 import time
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import RedirectResponse
@@ -81,7 +82,7 @@ async def linkedin_callback(request: Request, code: str, state: str):
         }
         
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
-        res = requests.post(token_url, data=token_data, headers=headers).json()
+        res = requests.post(token_url, data=token_data, headers=headers, timeout=SYNC_REQUEST_TIMEOUT).json()
         
         access_token = res.get("access_token")
         expires_in = res.get("expires_in", 5184000) # Defaults to ~60 days
@@ -95,7 +96,7 @@ async def linkedin_callback(request: Request, code: str, state: str):
         user_info_url = "https://api.linkedin.com/v2/userinfo"
         user_info = requests.get(user_info_url, headers={
             "Authorization": f"Bearer {access_token}"
-        }).json()
+        }, timeout=SYNC_REQUEST_TIMEOUT).json()
 
         linkedin_id = user_info.get("sub") # This is the unique Member ID
         user_name = f"{user_info.get('given_name')} {user_info.get('family_name')}"
@@ -1,16 +1,16 @@
 from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends
 from pydantic import BaseModel
 from services.post_manager import PostManager
-import os
 from utils.db_client import supabase
 import shutil
-from pathlib import Path
 from typing import Optional, List
 from datetime import datetime
 from services.subscription_service import SubscriptionService
 from utils.db_client import supabase
 from utils.oauth import get_current_user
 from utils.limiter import limiter
+from utils.storage import download_object
+from utils.scratch import ScratchSpace
 from fastapi import Request
 router = APIRouter()
 
@@ -30,45 +30,25 @@ class PublishRequest(BaseModel):
     platforms: list[str]
     scheduled_at: Optional[datetime] = None
 
-async def get_local_photo(file_name: str) -> str:
-    """Download photo from Supabase and return a local path"""
-    base_dir = Path(__file__).resolve().parents[1]
-    static_dir = base_dir / "static"
-    static_dir.mkdir(exist_ok=True)
-
-    local_path = str(static_dir / file_name)
-    if not os.path.exists(local_path):
-        print(f"DEBUG: File not found locally. Downloading to: {local_path}")
-        data = supabase.storage.from_("photos").download(file_name)
-        with open(local_path, "wb") as f:
-            f.write(data)
-            
+async def get_local_photo(file_name: str, scratch: ScratchSpace) -> str:
+    """Download photo from Supabase into the post's scratch directory and return the local path"""
+    local_path = scratch.file(file_name)
+    print(f"DEBUG: Downloading photo to: {local_path}")
+    await download_object("photos", file_name, local_path)
     return local_path
 
-async def get_local_video(file_name: str) -> str:
-    """Download video from Supabase and return a local path"""
-    # local_path = os.path.join("static", file_name)  # or /tmp
-    # if not os.path.exists(local_path):
-    #     data = supabase.storage.from_("videos").download(file_name)
-    #     with open(local_path, "wb") as f:
-    #         f.write(data)
-    # return local_path
-
-    # Get the absolute path to your 'backend' directory
-    base_dir = Path(__file__).resolve().parents[1] 
-    static_dir = base_dir / "static"
-    static_dir.mkdir(exist_ok=True)
-    
-    local_path = str(static_dir / file_name)
-    
-    if not os.path.exists(local_path):
-        print(f"DEBUG: File not found locally. Downloading to: {local_path}")
-        data = supabase.storage.from_("videos").download(file_name)
-        with open(local_path, "wb") as f:
-            f.write(data)
-            
+async def get_local_video(file_name: str, scratch: ScratchSpace) -> str:
+    """Download video from Supabase into the post's scratch directory and return the local path"""
+    local_path = scratch.file(file_name)
+    print(f"DEBUG: Downloading video to: {local_path}")
+    await download_object("videos", file_name, local_path)
     return local_path
 
+async def distribute_in_scratch(scratch: ScratchSpace, distribute, *args):
+    """Runs a PostManager distribution and removes the post's scratch directory afterwards."""
+    with scratch:
+        return await distribute(*args)
+
 
 @router.post("/photos")
 @limiter.limit("5/minute")
@@ -108,15 +88,18 @@ async def publish_photos(
     response = supabase.table("posts").insert(db_entry).execute()
     post_id = response.data[0]["id"]
 
-    local_paths = []
-    for photo_path in publish_request.photo_paths:
-        local_path = await get_local_photo(photo_path)
-        local_paths.append(local_path)
-    
     if not publish_request.scheduled_at:
+        scratch = ScratchSpace(post_id)
         try:
+            local_paths = []
+            for photo_path in publish_request.photo_paths:
+                local_path = await get_local_photo(photo_path, scratch)
+                local_paths.append(local_path)
+
             print(f"DEBUG: Uploading {len(local_paths)} photos...")
             background_tasks.add_task(
+                distribute_in_scratch,
+                scratch,
                 PostManager.distribute_photos,
                 post_id, # pass post id to background
                 safe_user_id,
@@ -127,6 +110,7 @@ async def publish_photos(
             print(f"DEBUG: Photo upload complete.")
             return {"status": "Processing", "message": f"Immediate upload started for {publish_request.platforms}"}
         except Exception as e:
+            scratch.cleanup()
             print(f"Error: {str(e)}")
             return {"status": "Error", "message": f"Failed to distribute photos: {str(e)}"}
     else:
@@ -201,9 +185,16 @@ async def publish_video(
     # 4. Publish now or wait for scheduler
 
     if not publish_request.scheduled_at:
-        local_path = await get_local_video(publish_request.video_path)
+        scratch = ScratchSpace(post_id)
+        try:
+            local_path = await get_local_video(publish_request.video_path, scratch)
+        except Exception:
+            scratch.cleanup()
+            raise
 
         background_tasks.add_task(
+            distribute_in_scratch,
+            scratch,
             PostManager.distribute_video,
             post_id, # pass post id to background
             safe_user_id,
@@ -1,5 +1,6 @@
 import os
 import requests
+from utils.deadline import SYNC_REQUEST_TIMEOUT
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import RedirectResponse
 from utils.db_client import UserManager
@@ -72,7 +73,7 @@ async def threads_callback(request: Request, code: str, state: str):
             "code": code
         }
         
-        res = requests.post(token_url, data=token_data).json()
+        res = requests.post(token_url, data=token_data, timeout=SYNC_REQUEST_TIMEOUT).json()
         short_token = res.get("access_token")
         threads_user_id = res.get("user_id") # Threads gives user_id directly here
         
@@ -86,7 +87,7 @@ async def threads_callback(request: Request, code: str, state: str):
             "client_secret": CLIENT_SECRET,
             "access_token": short_token
         }
-        ll_res = requests.get(ll_url, params=ll_params).json()
+        ll_res = requests.get(ll_url, params=ll_params, timeout=SYNC_REQUEST_TIMEOUT).json()
         long_lived_token = ll_res.get("access_token")
 
         if not long_lived_token:
@@ -97,7 +98,7 @@ async def threads_callback(request: Request, code: str, state: str):
         me_res = requests.get(me_url, params={
             "fields": "id,username",
             "access_token": long_lived_token
-        }).json()
+        }, timeout=SYNC_REQUEST_TIMEOUT).json()
 
         # 4. Save to Database
         # Matches: (user_id, platform, access_token, refresh_token, expires_at, platform_user_id)
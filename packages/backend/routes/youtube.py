@@ -7,6 +7,7 @@ from googleapiclient.http import MediaFileUpload
 import os
 import urllib.parse
 import requests
+from utils.deadline import SYNC_REQUEST_TIMEOUT
 import subprocess
 from utils.db_client import UserManager
 from datetime import datetime, timedelta
@@ -82,7 +83,7 @@ async def youtube_callback(request: Request, code: str, state: str):
         "grant_type": "authorization_code"
     }
 
-    response = requests.post(token_url, data=data)
+    response = requests.post(token_url, data=data, timeout=SYNC_REQUEST_TIMEOUT)
     if response.status_code != 200:
         raise HTTPException(status_code=400, detail=response.json())
     
@@ -1,11 +1,18 @@
+import asyncio
 import os
-import requests
 from datetime import datetime, timedelta, timezone
 from utils.db_client import UserManager
+from utils.retry import with_retry, PUBLISH_POLICY
+from utils.http_client import HttpClient
+from utils.media_buffer import MediaBuffer
+from utils import rupload
+
+# How many photos of one post are staged on the page at the same time
+PHOTO_STAGING_CONCURRENCY = int(os.getenv("FACEBOOK_PHOTO_STAGING_CONCURRENCY", "4"))
 
 class FacebookService:
     @staticmethod
-    def get_valid_token(user_id: str):
+    async def get_valid_token(user_id: str):
         """
         Retrieves the Page Access Token. 
         Note: Page tokens are usually long-lived (60 days) or permanent 
@@ -29,7 +36,7 @@ class FacebookService:
                 "client_secret": os.getenv("FACEBOOK_CLIENT_SECRET"),
                 "fb_exchange_token": account["access_token"]
             }
-            res = requests.get(url, params=params).json()
+            res = (await HttpClient.get(url, params=params)).json()
             
             if "access_token" not in res:
                 raise Exception(f"Facebook Refresh Failed: {res}")
@@ -44,21 +51,23 @@ class FacebookService:
         return account["access_token"], account["platform_user_id"]
 
     @staticmethod
-    async def upload_video(user_id: str, file_path: str, caption: str):
+    async def upload_video(user_id: str, file_path: str, caption: str, media: MediaBuffer = None):
         """
         High-Quality Resumable Upload Engine for Facebook Reels.
         """
         try:
             print(f"[FB Upload] Starting Facebook Reel upload...")
-            token, page_id = FacebookService.get_valid_token(user_id)
-            file_size = os.path.getsize(file_path)
+            token, page_id = await FacebookService.get_valid_token(user_id)
 
             # --- PHASE 1: INITIALIZE (START) ---
             init_url = f"https://graph.facebook.com/v19.0/{page_id}/video_reels"
-            init_res = requests.post(init_url, params={
-                "upload_phase": "start",
-                "access_token": token
-            }).json()
+            init_res = (await with_retry(
+                lambda: HttpClient.post(init_url, params={
+                    "upload_phase": "start",
+                    "access_token": token
+                }),
+                op="facebook.init"
+            )).json()
 
             if "video_id" not in init_res:
                 raise Exception(f"FB Init Failed: {init_res}")
@@ -69,14 +78,9 @@ class FacebookService:
 
             # --- PHASE 2: UPLOAD BYTES ---
             # Facebook Reels uses a binary POST to the upload_url
-            with open(file_path, "rb") as f:
-                headers = {
-                    "Authorization": f"OAuth {token}",
-                    "offset": "0",
-                    "file_size": str(file_size),
-                    "Content-Type": "application/octet-stream"
-                }
-                upload_res = requests.post(upload_url, data=f, headers=headers).json()
+            # Retries resume from the session's offset instead of byte 0
+            with MediaBuffer.borrow(media, file_path) as buffer:
+                upload_res = (await rupload.upload(upload_url, f"OAuth {token}", buffer, op="facebook.upload")).json()
             print(f"[FB Upload] upload_res: {upload_res}")
             print(f"[FB Upload] init_res: {init_res}")
             if not upload_res.get("success"):
@@ -96,7 +100,11 @@ class FacebookService:
             
             # Optional: Allow the video to be processed before finishing 
             # (FB is usually faster at ingest than Instagram)
-            publish_res = requests.post(publish_url, params=publish_params).json()
+            publish_res = (await with_retry(
+                lambda: HttpClient.post(publish_url, params=publish_params),
+                op="facebook.publish",
+                policy=PUBLISH_POLICY
+            )).json()
 
             if not publish_res.get("success"):
                 raise Exception(f"FB Finalize Failed: {publish_res}")
@@ -117,30 +125,50 @@ class FacebookService:
         """
         try:
             print(f"[FB Photo] Starting upload for {len(file_paths)} item(s)...")
-            token, page_id = FacebookService.get_valid_token(user_id)
-            attached_media = []
+            token, page_id = await FacebookService.get_valid_token(user_id)
+            url = f"https://graph.facebook.com/v19.0/{page_id}/photos"
+            slots = asyncio.Semaphore(PHOTO_STAGING_CONCURRENCY)
 
             # --- PHASE 1: STAGE PHOTOS (UNPUBLISHED) ---
             # We upload images individually to get IDs before creating the final post.
-            for path in file_paths:
+            # Photos are staged concurrently (PHOTO_STAGING_CONCURRENCY at a time);
+            # a failed photo is reported and skipped, the rest still get posted.
+            async def stage_photo(path: str):
                 if not os.path.exists(path):
-                    print(f"[FB Photo] File not found, skipping: {path}")
-                    continue
-
-                url = f"https://graph.facebook.com/v19.0/{page_id}/photos"
-                with open(path, "rb") as f:
-                    payload = {
-                        "published": "false",  # Crucial: prevents individual posts for every photo
-                        "access_token": token
-                    }
-                    files = {"source": f}
-                    res = requests.post(url, data=payload, files=files).json()
-                    
-                    if "id" in res:
-                        attached_media.append({"media_fbid": res["id"]})
-                        print(f"[FB Photo] Staged: {res['id']}")
-                    else:
-                        print(f"[FB Photo] Failed to stage {path}: {res}")
+                    return None, "file not found"
+
+                async with slots:
+                    try:
+                        with open(path, "rb") as f:
+                            photo = f.read()
+                        payload = {
+                            "published": "false",  # Crucial: prevents individual posts for every photo
+                            "access_token": token
+                        }
+
+                        res = (await with_retry(
+                            lambda: HttpClient.post(url, data=payload, files={"source": (os.path.basename(path), photo)}),
+                            op="facebook.stage_photo"
+                        )).json()
+                    except Exception as e:
+                        return None, str(e)
+
+                if "id" not in res:
+                    return None, res
+                print(f"[FB Photo] Staged: {res['id']}")
+                return res["id"], None
+
+            # gather keeps attached_media in the original photo order
+            staged = await asyncio.gather(*(stage_photo(path) for path in file_paths))
+
+            attached_media = []
+            failed_photos = []
+            for path, (photo_id, error) in zip(file_paths, staged):
+                if photo_id:
+                    attached_media.append({"media_fbid": photo_id})
+                else:
+                    print(f"[FB Photo] Failed to stage {path}: {error}")
+                    failed_photos.append({"path": path, "error": str(error)})
 
             if not attached_media:
                 raise Exception("No photos were successfully staged.")
@@ -155,7 +183,11 @@ class FacebookService:
                 "access_token": token
             }
             
-            publish_res = requests.post(publish_url, data=publish_payload).json()
+            publish_res = (await with_retry(
+                lambda: HttpClient.post(publish_url, data=publish_payload),
+                op="facebook.publish",
+                policy=PUBLISH_POLICY
+            )).json()
 
             if "id" not in publish_res:
                 raise Exception(f"FB Publish Failed: {publish_res}")
@@ -164,10 +196,13 @@ class FacebookService:
             actual_post_id = post_id.split('_')[-1]
             print(f"[FB Photo] Success! Post ID: {actual_post_id}")
             
-            return {
+            result = {
                 "platform": "facebook", 
                 "url": f"https://www.facebook.com/{page_id}/posts/{actual_post_id}"
             }
+            if failed_photos:
+                result["failed_photos"] = failed_photos
+            return result
 
         except Exception as e:
             print(f"[FB Service Error] {str(e)}")
@@ -1,9 +1,16 @@
+import asyncio
 import os
-import requests
-import time
 from utils.db_client import UserManager
 from datetime import datetime, timedelta, timezone
 from utils.db_client import supabase
+from utils.retry import with_retry, PUBLISH_POLICY
+from utils.http_client import HttpClient
+from utils.media_buffer import MediaBuffer
+from utils import rupload
+from utils.media_status_poller import MediaStatusPoller
+
+PHOTO_READY_TIMEOUT = 60
+REEL_READY_TIMEOUT = 300
 
 class InstagramService:
     @staticmethod
@@ -12,34 +19,20 @@ class InstagramService:
         return res
    
     @staticmethod
-    def wait_for_media_ready(media_id: str, token: str, timeout=60):
+    async def wait_for_media_ready(media_ids, token: str, timeout=60):
         """
         Instagram fetches media asynchronously.
         We MUST wait until status_code == FINISHED.
-        """
-        status_url = f"https://graph.facebook.com/v19.0/{media_id}"
-        start = time.time()
-
-        while time.time() - start < timeout:
-            res = requests.get(
-                status_url,
-                params={"fields": "status_code", "access_token": token}
-            ).json()
-
-            status = res.get("status_code")
-            print(f"[DEBUG] IG media {media_id} status:", status)
 
-            if status == "FINISHED":
-                return True
-            if status == "ERROR":
-                raise Exception(f"Instagram processing error: {res}")
-
-            time.sleep(3)
+        Accepts one container id or a list. The shared MediaStatusPoller
+        checks them together with every other upload's containers.
+        """
+        media_ids = [media_ids] if isinstance(media_ids, str) else list(media_ids)
+        await MediaStatusPoller.shared().wait(media_ids, token, timeout)
+        return True
 
-        raise TimeoutError("Instagram media processing timed out")
-    
     @staticmethod
-    def get_valid_token(user_id: str):
+    async def get_valid_token(user_id: str):
         """
         Ensures the Instagram Long-Lived token is still valid.
         If it's older than 45 days, we refresh it for another 60 days.
@@ -65,7 +58,7 @@ class InstagramService:
                 "fb_exchange_token": account["access_token"]
             }
             
-            response = requests.get(url, params=params).json()
+            response = (await HttpClient.get(url, params=params)).json()
             
             if "access_token" not in response:
                 raise Exception(f"Instagram Token Refresh Failed: {response}")
@@ -85,13 +78,12 @@ class InstagramService:
         return account["access_token"], account["platform_user_id"]
 
     @staticmethod
-    async def upload_video(user_id: str, file_path: str, caption: str):
+    async def upload_video(user_id: str, file_path: str, caption: str, media: MediaBuffer = None):
         """
         High-Quality Resumable Upload for Instagram Reels.
         """
         try:
-            token, ig_user_id = InstagramService.get_valid_token(user_id)
-            file_size = os.path.getsize(file_path)
+            token, ig_user_id = await InstagramService.get_valid_token(user_id)
 
             # --- STEP 1: Create a Media Container ---
             # We tell Instagram we are sending a REEL
@@ -102,7 +94,10 @@ class InstagramService:
                 "upload_type": "resumable",
                 "access_token": token
             }
-            init_res = requests.post(init_url, params=params).json()
+            init_res = (await with_retry(
+                lambda: HttpClient.post(init_url, params=params),
+                op="instagram.create_container"
+            )).json()
             
             if "id" not in init_res:
                 raise Exception(f"Instagram Init Failed: {init_res}")
@@ -113,15 +108,10 @@ class InstagramService:
             # Instagram uses a specific 'rupload' host for pushing binaries
             upload_url = f"https://rupload.facebook.com/ig-api-upload/{container_id}"
 
-            with open(file_path, "rb") as f:
-                headers = {
-                    "Authorization": f"Bearer {token}",
-                    "offset": "0",
-                    "file_size": str(file_size),
-                    "Content-Type": "application/octet-stream"
-                }
-                response = requests.post(upload_url, data=f, headers=headers)
-                upload_res = response.json()
+            # Retries resume from the session's offset instead of byte 0
+            with MediaBuffer.borrow(media, file_path) as buffer:
+                response = await rupload.upload(upload_url, f"Bearer {token}", buffer, op="instagram.upload")
+            upload_res = response.json()
 
             # Fix: Instagram resumable upload returns {'success': True} 
             # instead of {'status': 'success'}
@@ -134,28 +124,18 @@ class InstagramService:
            
             # --- STEP 3: Wait for Processing ---
             # Instagram must process the video before it can be published.
-            # We check the status every few seconds.
-            
-            
-            status_url = f"https://graph.facebook.com/v19.0/{container_id}"
-            max_retries = 30
-            for _ in range(max_retries):
-                check = requests.get(status_url, params={"fields": "status_code", "access_token": token}).json()
-                status = check.get("status_code")
-                
-                if status == "FINISHED":
-                    break
-                elif status == "ERROR":
-                    raise Exception("Instagram processing failed.")
-                
-                time.sleep(5)
+            await InstagramService.wait_for_media_ready(container_id, token, timeout=REEL_READY_TIMEOUT)
 
             # --- STEP 4: Finalize & Publish ---
             publish_url = f"https://graph.facebook.com/v19.0/{ig_user_id}/media_publish"
-            publish_res = requests.post(publish_url, params={
-                "creation_id": container_id,
-                "access_token": token
-            }).json()
+            publish_res = (await with_retry(
+                lambda: HttpClient.post(publish_url, params={
+                    "creation_id": container_id,
+                    "access_token": token
+                }),
+                op="instagram.publish",
+                policy=PUBLISH_POLICY
+            )).json()
 
             print(f"Successfully posted to Instagram! Media ID: {publish_res.get('id')}")
             media_id= publish_res.get("id")
@@ -166,10 +146,13 @@ class InstagramService:
             # --- STEP 5: Fetch the Permalink ---
             # We query the newly created Media ID to get its public URL
             media_info_url = f"https://graph.facebook.com/v19.0/{media_id}"
-            media_info = requests.get(media_info_url, params={
-                "fields": "permalink",
-                "access_token": token
-            }).json()
+            media_info = (await with_retry(
+                lambda: HttpClient.get(media_info_url, params={
+                    "fields": "permalink",
+                    "access_token": token
+                }),
+                op="instagram.permalink"
+            )).json()
 
             ig_url = media_info.get("permalink")
 
@@ -192,13 +175,13 @@ class InstagramService:
         """
         base_path = [os.path.basename(p) for p in full_file_paths]
         print(f"DEBUG: base_path: {base_path}")
-        token, ig_user_id = InstagramService.get_valid_token(user_id)
+        token, ig_user_id = await InstagramService.get_valid_token(user_id)
         bucket = "photos"
 
         # upload supabase_paths to supabase storage
-        for local_path, storage_name in zip(full_file_paths, base_path):
+        def upload_to_storage(local_path: str, storage_name: str):
             with open(local_path, "rb") as f:
-                res = supabase.storage.from_(bucket).upload(
+                supabase.storage.from_(bucket).upload(
                     path=storage_name, 
                     file=f, 
                     file_options={
@@ -207,6 +190,12 @@ class InstagramService:
                     }
                 )
             print(f"DEBUG: Supabase upload success: {storage_name}")
+
+        # The storage client is blocking; upload all images side by side in threads
+        await asyncio.gather(*(
+            asyncio.to_thread(upload_to_storage, local_path, storage_name)
+            for local_path, storage_name in zip(full_file_paths, base_path)
+        ))
         try:
             # --------------------------------------------
             # STEP 1: Supabase paths → public URLs
@@ -217,33 +206,33 @@ class InstagramService:
             ]
 
             # --------------------------------------------
-            # STEP 2: Create image containers
+            # STEP 2+3: Create image containers and WAIT for them to finish
             # --------------------------------------------
-            media_ids = []
-
-            for url in image_urls:
-                res = requests.post(
-                    f"https://graph.facebook.com/v19.0/{ig_user_id}/media",
-                    params={
-                        "image_url": url,
-                        "is_carousel_item": "true" if len(image_urls) > 1 else "false",
-                        "access_token": token,
-                    },
-                ).json()
+            # All children are created and awaited concurrently, so a
+            # carousel is ready about as soon as its slowest image.
+            async def create_child(url: str) -> str:
+                res = (await with_retry(
+                    lambda: HttpClient.post(
+                        f"https://graph.facebook.com/v19.0/{ig_user_id}/media",
+                        params={
+                            "image_url": url,
+                            "is_carousel_item": "true" if len(image_urls) > 1 else "false",
+                            "access_token": token,
+                        },
+                    ),
+                    op="instagram.create_container"
+                )).json()
 
                 print("[DEBUG] IG image init:", res)
 
                 if "id" not in res:
                     raise Exception(f"Image container creation failed: {res}")
 
-                media_id = res["id"]
-                media_ids.append(media_id)
+                await InstagramService.wait_for_media_ready(res["id"], token, timeout=PHOTO_READY_TIMEOUT)
+                return res["id"]
 
-            # --------------------------------------------
-            # STEP 3: WAIT for each image to finish
-            # --------------------------------------------
-            for media_id in media_ids:
-                InstagramService.wait_for_media_ready(media_id, token)
+            # gather keeps the original image order for the carousel
+            media_ids = list(await asyncio.gather(*(create_child(url) for url in image_urls)))
 
             # --------------------------------------------
             # STEP 4: Create final container
@@ -251,21 +240,27 @@ class InstagramService:
             if len(media_ids) == 1:
                 final_creation_id = media_ids[0]
 
-                requests.post(
-                    f"https://graph.facebook.com/v19.0/{final_creation_id}",
-                    params={"caption": caption, "access_token": token},
+                await with_retry(
+                    lambda: HttpClient.post(
+                        f"https://graph.facebook.com/v19.0/{final_creation_id}",
+                        params={"caption": caption, "access_token": token},
+                    ),
+                    op="instagram.caption"
                 )
 
             else:
-                carousel = requests.post(
-                    f"https://graph.facebook.com/v19.0/{ig_user_id}/media",
-                    params={
-                        "media_type": "CAROUSEL",
-                        "children": ",".join(media_ids),
-                        "caption": caption,
-                        "access_token": token,
-                    },
-                ).json()
+                carousel = (await with_retry(
+                    lambda: HttpClient.post(
+                        f"https://graph.facebook.com/v19.0/{ig_user_id}/media",
+                        params={
+                            "media_type": "CAROUSEL",
+                            "children": ",".join(media_ids),
+                            "caption": caption,
+                            "access_token": token,
+                        },
+                    ),
+                    op="instagram.create_container"
+                )).json()
 
                 print("[DEBUG] Carousel init:", carousel)
 
@@ -274,15 +269,19 @@ class InstagramService:
 
                 final_creation_id = carousel["id"]
 
-                InstagramService.wait_for_media_ready(final_creation_id, token)
+                await InstagramService.wait_for_media_ready(final_creation_id, token, timeout=PHOTO_READY_TIMEOUT)
 
             # --------------------------------------------
             # STEP 5: Publish
             # --------------------------------------------
-            publish = requests.post(
-                f"https://graph.facebook.com/v19.0/{ig_user_id}/media_publish",
-                params={"creation_id": final_creation_id, "access_token": token},
-            ).json()
+            publish = (await with_retry(
+                lambda: HttpClient.post(
+                    f"https://graph.facebook.com/v19.0/{ig_user_id}/media_publish",
+                    params={"creation_id": final_creation_id, "access_token": token},
+                ),
+                op="instagram.publish",
+                policy=PUBLISH_POLICY
+            )).json()
 
             if "id" not in publish:
                 raise Exception(f"Publish failed: {publish}")
@@ -292,10 +291,13 @@ class InstagramService:
             # --------------------------------------------
             # STEP 6: Get permalink
             # --------------------------------------------
-            permalink = requests.get(
-                f"https://graph.facebook.com/v19.0/{media_id}",
-                params={"fields": "permalink", "access_token": token},
-            ).json().get("permalink")
+            permalink = (await with_retry(
+                lambda: HttpClient.get(
+                    f"https://graph.facebook.com/v19.0/{media_id}",
+                    params={"fields": "permalink", "access_token": token},
+                ),
+                op="instagram.permalink"
+            )).json().get("permalink")
 
             return {"platform": "instagram", "url": permalink}
 
@@ -1,12 +1,28 @@
+import asyncio
 import os
-import requests
 import time
+from urllib.parse import quote
 from datetime import datetime, timedelta, timezone
 from utils.db_client import UserManager
+from utils.retry import with_retry, UPLOAD_POLICY, PUBLISH_POLICY
+from utils.http_client import HttpClient
+from utils.media_buffer import MediaBuffer
+
+# How many parts of one video are uploaded at the same time
+PART_UPLOAD_CONCURRENCY = int(os.getenv("LINKEDIN_PART_UPLOAD_CONCURRENCY", "4"))
+# How many image binaries of one post are uploaded at the same time
+IMAGE_UPLOAD_CONCURRENCY = int(os.getenv("LINKEDIN_IMAGE_UPLOAD_CONCURRENCY", "4"))
+# Video asset status polling after finalizeUpload: first check after
+# POLL_INITIAL_DELAY seconds, then back off by POLL_BACKOFF_FACTOR up to
+# POLL_MAX_DELAY between checks.
+POLL_INITIAL_DELAY = 1.0
+POLL_BACKOFF_FACTOR = 1.5
+POLL_MAX_DELAY = 10.0
+VIDEO_READY_TIMEOUT = 600
 
 class LinkedInService:
     @staticmethod
-    def get_valid_token(user_id: str):
+    async def get_valid_token(user_id: str):
         """
         Retrieves and refreshes the LinkedIn 3-legged access token.
         LinkedIn tokens typically last 60 days.
@@ -33,7 +49,7 @@ class LinkedInService:
                 "client_id": os.getenv("LINKEDIN_CLIENT_ID"),
                 "client_secret": os.getenv("LINKEDIN_CLIENT_SECRET"),
             }
-            res = requests.post(url, data=data).json()
+            res = (await HttpClient.post(url, data=data)).json()
             
             if "access_token" not in res:
                 raise Exception(f"LinkedIn Refresh Failed: {res}")
@@ -49,13 +65,44 @@ class LinkedInService:
         return account["access_token"], account["platform_user_id"]
 
     @staticmethod
-    async def upload_video(user_id: str, file_path: str, caption: str):
+    async def wait_for_video_ready(video_urn: str, headers: dict, timeout=VIDEO_READY_TIMEOUT):
+        """
+        Polls the video asset until LinkedIn reports it AVAILABLE. Checks start
+        1s apart and back off up to 10s, so small videos are posted right away
+        and big ones get as long as they need (up to `timeout`).
+        """
+        status_url = f"https://api.linkedin.com/rest/videos/{quote(video_urn, safe='')}"
+        start = time.monotonic()
+        delay = POLL_INITIAL_DELAY
+
+        while True:
+            res = (await with_retry(
+                lambda: HttpClient.get(status_url, headers=headers),
+                op="linkedin.video_status"
+            )).json()
+            status = res.get("status")
+            print(f"[LinkedIn Upload] Video {video_urn} status: {status}")
+
+            if status == "AVAILABLE":
+                return True
+            if status == "PROCESSING_FAILED":
+                raise Exception(f"LinkedIn video processing failed: {res.get('processingFailureReason', res)}")
+
+            elapsed = time.monotonic() - start
+            if elapsed >= timeout:
+                raise TimeoutError(f"LinkedIn video processing timed out ({status})")
+
+            await asyncio.sleep(min(delay, timeout - elapsed))
+            delay = min(delay * POLL_BACKOFF_FACTOR, POLL_MAX_DELAY)
+
+    @staticmethod
+    async def upload_video(user_id: str, file_path: str, caption: str, media: MediaBuffer = None):
         """
         LinkedIn Multi-part Video Upload Engine.
         """
         try:
             print(f"[LinkedIn Upload] Starting upload...")
-            token, person_urn = LinkedInService.get_valid_token(user_id)
+            token, person_urn = await LinkedInService.get_valid_token(user_id)
             file_size = os.path.getsize(file_path)
             headers = {
                 "Authorization": f"Bearer {token}",
@@ -73,7 +120,10 @@ class LinkedInService:
                     "uploadThumbnail": False
                 }
             }
-            init_res = requests.post(init_url, json=init_data, headers=headers).json()
+            init_res = (await with_retry(
+                lambda: HttpClient.post(init_url, json=init_data, headers=headers),
+                op="linkedin.init"
+            )).json()
             
             value = init_res.get("value")
             if not value:
@@ -85,27 +135,48 @@ class LinkedInService:
             print(f"[LinkedIn Upload] Session initialized. Video URN: {video_urn}")
 
             # --- PHASE 2: UPLOAD PARTS ---
-            # LinkedIn provides specific byte ranges for chunks
-            uploaded_part_ids = []
-            with open(file_path, "rb") as f:
-                for instruction in upload_instructions:
-                    first_byte = instruction["firstByte"]
-                    last_byte = instruction["lastByte"]
-                    upload_url = instruction["uploadUrl"]
-                    
-                    # Read the specific chunk
-                    f.seek(first_byte)
-                    chunk_data = f.read(last_byte - first_byte + 1)
-                    
+            # LinkedIn provides specific byte ranges for chunks, each with its
+            # own presigned URL, so parts are uploaded in parallel
+            # (PART_UPLOAD_CONCURRENCY at a time) straight out of the shared mmap
+            # of the file.
+            part_slots = asyncio.Semaphore(PART_UPLOAD_CONCURRENCY)
+
+            async def upload_part(buffer: MediaBuffer, instruction) -> str:
+                first_byte = instruction["firstByte"]
+                last_byte = instruction["lastByte"]
+                upload_url = instruction["uploadUrl"]
+
+                async with part_slots:
                     # Upload using PUT (no Auth header for the upload link itself)
-                    chunk_res = requests.put(upload_url, data=chunk_data)
-                    
-                    # Capture ETag for finalization
-                    etag = chunk_res.headers.get("ETag")
-                    if not etag:
-                        raise Exception("Failed to get ETag for video part")
-                    uploaded_part_ids.append(etag)
-                    print(f"[LinkedIn Upload] Part {first_byte}-{last_byte} uploaded.")
+                    # A failed part is resent on its own, other parts stay uploaded
+                    chunk_res = await with_retry(
+                        lambda: HttpClient.put(
+                            upload_url,
+                            content=buffer.stream(first_byte, last_byte + 1),
+                            headers={"Content-Length": str(last_byte - first_byte + 1)}
+                        ),
+                        op="linkedin.part",
+                        policy=UPLOAD_POLICY
+                    )
+
+                # Capture ETag for finalization
+                etag = chunk_res.headers.get("ETag")
+                if not etag:
+                    raise Exception(f"Failed to get ETag for video part {first_byte}-{last_byte}")
+                print(f"[LinkedIn Upload] Part {first_byte}-{last_byte} uploaded.")
+                return etag
+
+            with MediaBuffer.borrow(media, file_path) as buffer:
+                parts = [asyncio.create_task(upload_part(buffer, instruction)) for instruction in upload_instructions]
+                try:
+                    # ETags must be listed in part order; gather keeps it
+                    uploaded_part_ids = list(await asyncio.gather(*parts))
+                except BaseException:
+                    # Stop the other parts before the buffer is released under them
+                    for part in parts:
+                        part.cancel()
+                    await asyncio.gather(*parts, return_exceptions=True)
+                    raise
 
             # --- PHASE 3: FINALIZE UPLOAD ---
             finalize_url = "https://api.linkedin.com/rest/videos?action=finalizeUpload"
@@ -116,12 +187,15 @@ class LinkedInService:
                     "uploadedPartIds": uploaded_part_ids
                 }
             }
-            requests.post(finalize_url, json=finalize_data, headers=headers)
+            await with_retry(
+                lambda: HttpClient.post(finalize_url, json=finalize_data, headers=headers),
+                op="linkedin.finalize"
+            )
             print("[LinkedIn Upload] Finalization request sent.")
 
             # --- PHASE 4: CREATE THE POST (SHARE) ---
-            # We wait a moment for LinkedIn to process the video asset
-            time.sleep(5) 
+            # LinkedIn has to finish processing the video asset first
+            await LinkedInService.wait_for_video_ready(video_urn, headers)
             post_url = "https://api.linkedin.com/rest/posts"
             post_data = {
                 "author": f"urn:li:person:{person_urn}",
@@ -139,7 +213,11 @@ class LinkedInService:
                 },
                 "lifecycleState": "PUBLISHED"
             }
-            post_res = requests.post(post_url, json=post_data, headers=headers)
+            post_res = await with_retry(
+                lambda: HttpClient.post(post_url, json=post_data, headers=headers),
+                op="linkedin.post",
+                policy=PUBLISH_POLICY
+            )
             
             if post_res.status_code != 201:
                 raise Exception(f"LinkedIn Posting Failed: {post_res.text}")
@@ -173,7 +251,7 @@ class LinkedInService:
         """
         try:
             print(f"[LinkedIn Photo] Starting upload for {len(file_paths)} item(s)...")
-            token, person_urn = LinkedInService.get_valid_token(user_id)
+            token, person_urn = await LinkedInService.get_valid_token(user_id)
             headers = {
                 "Authorization": f"Bearer {token}",
                 "X-Restli-Protocol-Version": "2.0.0",
@@ -181,34 +259,55 @@ class LinkedInService:
                 "Content-Type": "application/json"
             }
 
-            media_assets = []
+            register_url = "https://api.linkedin.com/rest/images?action=initializeUpload"
+            register_data = {
+                "initializeUploadRequest": {
+                    "owner": f"urn:li:person:{person_urn}"
+                }
+            }
+            upload_slots = asyncio.Semaphore(IMAGE_UPLOAD_CONCURRENCY)
 
-            for path in file_paths:
+            # Every photo is registered at once; each binary starts uploading
+            # as soon as its own upload URL arrives (IMAGE_UPLOAD_CONCURRENCY
+            # at a time). A failed photo is logged and skipped.
+            async def stage_image(path: str):
                 if not os.path.exists(path):
-                    continue
+                    return None
+
+                try:
+                    # --- PHASE 1: REGISTER IMAGE ---
+                    reg_res = (await with_retry(
+                        lambda: HttpClient.post(register_url, json=register_data, headers=headers),
+                        op="linkedin.register_image"
+                    )).json()
+                    
+                    image_urn = reg_res["value"]["image"]
+                    upload_url = reg_res["value"]["uploadUrl"]
+
+                    # --- PHASE 2: UPLOAD BINARY ---
+                    async with upload_slots:
+                        with open(path, "rb") as f:
+                            image = f.read()
+                        # PUT request to the provided uploadUrl (No Auth header required for this specific URL)
+                        upload_res = await with_retry(
+                            lambda: HttpClient.put(upload_url, content=image),
+                            op="linkedin.image",
+                            policy=UPLOAD_POLICY
+                        )
+                except Exception as e:
+                    print(f"[LinkedIn Photo] Failed to stage {path}: {e}")
+                    return None
+
+                if upload_res.status_code != 201:
+                    print(f"[LinkedIn Photo] Failed to upload binary for {path}")
+                    return None
 
-                # --- PHASE 1: REGISTER IMAGE ---
-                register_url = "https://api.linkedin.com/rest/images?action=initializeUpload"
-                register_data = {
-                    "initializeUploadRequest": {
-                        "owner": f"urn:li:person:{person_urn}"
-                    }
-                }
-                reg_res = requests.post(register_url, json=register_data, headers=headers).json()
-                
-                image_urn = reg_res["value"]["image"]
-                upload_url = reg_res["value"]["uploadUrl"]
-
-                # --- PHASE 2: UPLOAD BINARY ---
-                with open(path, "rb") as f:
-                    # PUT request to the provided uploadUrl (No Auth header required for this specific URL)
-                    upload_res = requests.put(upload_url, data=f)
-                    if upload_res.status_code != 201:
-                        print(f"[LinkedIn Photo] Failed to upload binary for {path}")
-                        continue
-
-                media_assets.append({"id": image_urn})
                 print(f"[LinkedIn Photo] Staged: {image_urn}")
+                return {"id": image_urn}
+
+            # gather keeps the images in their original order
+            staged = await asyncio.gather(*(stage_image(path) for path in file_paths))
+            media_assets = [asset for asset in staged if asset]
 
             if not media_assets:
                 raise Exception("No photos were successfully staged.")
@@ -237,7 +336,11 @@ class LinkedInService:
                 "lifecycleState": "PUBLISHED"
             }
 
-            post_res = requests.post(post_url, json=post_data, headers=headers)
+            post_res = await with_retry(
+                lambda: HttpClient.post(post_url, json=post_data, headers=headers),
+                op="linkedin.post",
+                policy=PUBLISH_POLICY
+            )
             
             if post_res.status_code != 201:
                 raise Exception(f"LinkedIn Photo Posting Failed: {post_res.text}")
@@ -1,4 +1,5 @@
 import asyncio
+from contextlib import ExitStack
 from services.youtube import YouTubeService
 from services.tiktok import TikTokService
 from services.instagram import InstagramService
@@ -7,13 +8,34 @@ from services.linkedin import LinkedInService
 from utils.db_client import supabase
 from services.subscription_service import SubscriptionService
 import os
-from utils.video_processor import VideoProcessor
+from utils.video_processor import VideoProcessor, PHOTO_SQUARE, PHOTO_SQUARE_BRANDED, PHOTO_FULL_BRANDED
+from utils.media_buffer import MediaBuffer
 
 
 class PostManager:
     @staticmethod
-    async def distribute_photos(post_id: str, user_id: str, file_paths: list, caption: str, platforms: list):
-        
+    def start_uploads(uploads: dict, on_upload=None) -> dict:
+        """
+        Starts every platform's upload as its own task. `on_upload(platform,
+        task)` is called for each, so a caller can cancel one platform (the
+        scheduler does when it loses that target's lease) and the others
+        still finish.
+        """
+        tasks = {platform: asyncio.create_task(upload) for platform, upload in uploads.items()}
+        if on_upload:
+            for platform, task in tasks.items():
+                on_upload(platform, task)
+        return tasks
+
+    @staticmethod
+    async def distribute_photos(post_id: str, user_id: str, file_paths: list, caption: str, platforms: list, scheduled: bool = False, on_upload=None):
+        """
+        Uploads the photos to every requested platform and returns
+        {platform: result}. When the scheduler drives the post (scheduled=True)
+        it records the results per platform and removes the source photos
+        from storage itself once no platform needs them anymore.
+        """
+
         supabase_paths = [] # may be watermarked paths
         original_supabase_paths = [] # non-watermarked paths
         full_supabase_paths = [] # full directory paths
@@ -26,30 +48,40 @@ class PostManager:
             supabase_path = os.path.basename(path)
             original_supabase_paths.append(supabase_path)
             supabase_paths.append(supabase_path)
-            clean_path, branded_path = VideoProcessor.process_photo_for_social(path)
-            clean_cropped_paths.append(clean_path)
-            watermarked_cropped_paths.append(branded_path)
 
         
         try:
-            tasks = []
+            tasks = {}
             print("[DEBUG] getting user perms")
             user_perms = await SubscriptionService.get_user_permissions(user_id, supabase)
             requested_platforms = len(platforms)
             print(f"DEBUG: User perms for watermark: {user_perms.get('no_watermark')}")
+            if requested_platforms > user_perms["max_platforms"]:
+                return {"error": f"Upgrade to reach more than {user_perms['max_platforms']} platforms."}
+
+            # Only the renditions these platforms upload are produced, each
+            # photo decoded once, all photos in parallel
+            renditions = VideoProcessor.plan_photo_renditions(platforms, not user_perms.get("no_watermark", False))
+            print(f"DEBUG: Photo renditions needed: {sorted(renditions)}")
+            branded_full_paths = []
+            for outputs in await VideoProcessor.render_photos(file_paths, renditions):
+                if PHOTO_SQUARE in outputs:
+                    clean_cropped_paths.append(outputs[PHOTO_SQUARE])
+                if PHOTO_SQUARE_BRANDED in outputs:
+                    watermarked_cropped_paths.append(outputs[PHOTO_SQUARE_BRANDED])
+                if PHOTO_FULL_BRANDED in outputs:
+                    branded_full_paths.append(outputs[PHOTO_FULL_BRANDED])
 
             print(f"DEBUG: watermarked_cropped_paths: {watermarked_cropped_paths}")
             print(f"DEBUG: clean_cropped_paths: {clean_cropped_paths}")
-            paths_to_upload = watermarked_cropped_paths if not user_perms.get("no_watermark") else clean_cropped_paths
-            if not user_perms.get("no_watermark", False):
-                full_supabase_paths = VideoProcessor.add_photo_watermark(file_paths)
-                supabase_paths = [path.replace(".jpg", "_watermarked.jpg") for path in supabase_paths]
+            paths_to_upload = watermarked_cropped_paths or clean_cropped_paths
+            if branded_full_paths:
+                full_supabase_paths = branded_full_paths
+                supabase_paths = [os.path.basename(path) for path in branded_full_paths]
                 
                 print(f"DEBUG: Watermarking complete. New paths: {supabase_paths}")
             else:
                 print(f"DEBUG: Watermarking skipped. Paths: {supabase_paths}")
-            if requested_platforms > user_perms["max_platforms"]:
-                return {"error": f"Upgrade to reach more than {user_perms['max_platforms']} platforms."}
             
             user_perms = await SubscriptionService.get_user_permissions(user_id, supabase)
             if not user_perms["non_branded_caption"]:
@@ -60,24 +92,25 @@ class PostManager:
             print(f"DEBUG: full_supabase_paths: {full_supabase_paths}")
             if "instagram" in platforms:
                 print(f"paths to upload: {paths_to_upload}")
-                tasks.append(InstagramService.upload_photos(user_id, paths_to_upload, caption))
+                tasks["instagram"] = InstagramService.upload_photos(user_id, paths_to_upload, caption)
 
             if "facebook" in platforms:
-                tasks.append(FacebookService.upload_photos(user_id, full_supabase_paths, caption))
+                tasks["facebook"] = FacebookService.upload_photos(user_id, full_supabase_paths, caption)
 
             if "linkedin" in platforms:
-                tasks.append(LinkedInService.upload_photos(user_id, full_supabase_paths, caption))
+                tasks["linkedin"] = LinkedInService.upload_photos(user_id, full_supabase_paths, caption)
             
             # Run all uploads at the same time!
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+            tasks = PostManager.start_uploads(tasks, on_upload)
+            results = dict(zip(tasks, await asyncio.gather(*tasks.values(), return_exceptions=True)))
 
             links_to_save = {}
-            for res in results:
+            for res in results.values():
                 if isinstance(res, dict) and res.get("url"):
                     links_to_save[res["platform"]] = res["url"]
 
             # Update the row in Supabase using the post_id
-            if links_to_save:
+            if links_to_save and not scheduled:
                 supabase.table("posts").update({
                     "platform_links": links_to_save,
                     "status": "published" # added
@@ -107,8 +140,11 @@ class PostManager:
                     os.remove(path)
                     print(f"DEBUG: Removed local file {path}")
             try:
-                supabase.storage.from_("photos").remove(supabase_paths)
-                supabase.storage.from_("photos").remove(original_supabase_paths)
+                if not scheduled:
+                    supabase.storage.from_("photos").remove(supabase_paths)
+                    supabase.storage.from_("photos").remove(original_supabase_paths)
+                    print(f"DEBUG: Removed {supabase_paths} from Supabase Storage")
+                    print(f"DEBUG: Removed {original_supabase_paths} from Supabase Storage")
                 cropped_base_paths = []
                 for path in clean_cropped_paths:
                     cropped_base_paths.append(os.path.basename(path)) 
@@ -116,64 +152,79 @@ class PostManager:
                     cropped_base_paths.append(os.path.basename(path))
                 supabase.storage.from_("photos").remove(cropped_base_paths)
                 print(f"DEBUG: Removed {cropped_base_paths} from Supabase Storage")
-                print(f"DEBUG: Removed {supabase_paths} from Supabase Storage")
-                print(f"DEBUG: Removed {original_supabase_paths} from Supabase Storage")
             except Exception as e:
                 print(f"Cleanup Error: {str(e)}")
         
         
     @staticmethod
-    async def distribute_video(post_id: str, user_id: str, file_path: str, caption: str, description: str, platforms: list):
+    async def distribute_video(post_id: str, user_id: str, file_path: str, caption: str, description: str, platforms: list, scheduled: bool = False, on_upload=None):
+        """
+        Coordinates multi-platform uploads and returns {platform: result}.
+        With scheduled=True the scheduler records the per-platform results
+        and removes the source video from storage once every platform is done.
+        """
         original_path = file_path # assume it looks like /videos/video.mp4
         supabase_path = os.path.basename(file_path)
+        video_paths = {} # platform -> the rendition it uploads
         try:
-            """
-            Coordinates multi-platform uploads.
-            """
-            tasks = []
+            tasks = {}
             user_perms = await SubscriptionService.get_user_permissions(user_id, supabase)
             requested_platforms = len(platforms)
             print(f"DEBUG: User perms for watermark: {user_perms.get('no_watermark')}")
 
+            if requested_platforms > user_perms["max_platforms"]:
+                return {"error": f"Upgrade to reach more than {user_perms['max_platforms']} platforms."}
             if not user_perms.get("no_watermark", False):
-                watermarked_path = file_path.replace(".mp4", "_watermarked.mp4")
-                file_path = VideoProcessor.add_unipost_watermark(file_path, watermarked_path)
-                supabase_path = (os.path.basename(file_path)).replace("_watermarked.mp4", ".mp4")
-                print(f"DEBUG: Watermarking complete. New path: {file_path}")
+                # One decode, one encode per platform profile
+                video_paths = await asyncio.to_thread(VideoProcessor.render_video, file_path, platforms)
+                print(f"DEBUG: Watermarking complete. New paths: {video_paths}")
             else:
+                video_paths = {platform: file_path for platform in platforms}
                 print(f"DEBUG: Watermarking skipped. Path: {file_path}")
-            if requested_platforms > user_perms["max_platforms"]:
-                return {"error": f"Upgrade to reach more than {user_perms['max_platforms']} platforms."}
             youtube_caption = caption
             if not user_perms["non_branded_caption"]:
                 caption += "\nPosted via UniCore on iOS #unicore #poweredbyunicore"
                 description += "\nPosted via UniCore on iOS #unicore #poweredbyunicore"
 
-            if "youtube" in platforms:
-                tasks.append(YouTubeService.upload_video(user_id, file_path, youtube_caption, description))
-                
-            if "tiktok" in platforms:
-                tasks.append(TikTokService.upload_video(user_id, file_path, caption))
-                
-            if "instagram" in platforms:
-                tasks.append(InstagramService.upload_video(user_id, file_path, caption))
-        
-            if "facebook" in platforms:
-                tasks.append(FacebookService.upload_video(user_id, file_path, caption))
+            # Each rendition is mapped into memory once and every platform
+            # using it streams from the same pages (YouTube's client reads the
+            # file itself)
+            with ExitStack() as stack:
+                media = {
+                    path: stack.enter_context(MediaBuffer(path))
+                    for path in {path for platform, path in video_paths.items() if platform != "youtube"}
+                }
+
+                if "youtube" in platforms:
+                    tasks["youtube"] = YouTubeService.upload_video(user_id, video_paths["youtube"], youtube_caption, description)
+                    
+                if "tiktok" in platforms:
+                    path = video_paths["tiktok"]
+                    tasks["tiktok"] = TikTokService.upload_video(user_id, path, caption, media=media[path])
+                    
+                if "instagram" in platforms:
+                    path = video_paths["instagram"]
+                    tasks["instagram"] = InstagramService.upload_video(user_id, path, caption, media=media[path])
             
-            if "linkedin" in platforms:
-                tasks.append(LinkedInService.upload_video(user_id, file_path, caption))
+                if "facebook" in platforms:
+                    path = video_paths["facebook"]
+                    tasks["facebook"] = FacebookService.upload_video(user_id, path, caption, media=media[path])
+                
+                if "linkedin" in platforms:
+                    path = video_paths["linkedin"]
+                    tasks["linkedin"] = LinkedInService.upload_video(user_id, path, caption, media=media[path])
 
-            # Run all uploads at the same time!
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+                # Run all uploads at the same time!
+                tasks = PostManager.start_uploads(tasks, on_upload)
+                results = dict(zip(tasks, await asyncio.gather(*tasks.values(), return_exceptions=True)))
 
             links_to_save = {}
-            for res in results:
+            for res in results.values():
                 if isinstance(res, dict) and res.get("url"):
                     links_to_save[res["platform"]] = res["url"]
 
             # Update the row in Supabase using the post_id
-            if links_to_save:
+            if links_to_save and not scheduled:
                 supabase.table("posts").update({
                     "platform_links": links_to_save,
                     "status": "published" # added
@@ -182,15 +233,17 @@ class PostManager:
 
             return results
         finally:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                print(f"DEBUG: Removed local file {file_path}")
+            for path in set(video_paths.values()):
+                if os.path.exists(path):
+                    os.remove(path)
+                    print(f"DEBUG: Removed local file {path}")
             if os.path.exists(original_path):
                 os.remove(original_path)
                 print(f"DEBUG: Removed local file {original_path}")
 
             try:
-                supabase.storage.from_("videos").remove([supabase_path])
-                print(f"DEBUG: Removed {supabase_path} from Supabase Storage")
+                if not scheduled:
+                    supabase.storage.from_("videos").remove([supabase_path])
+                    print(f"DEBUG: Removed {supabase_path} from Supabase Storage")
             except Exception as e:
                 print(f"Cleanup Error: {str(e)}")
\ No newline at end of file
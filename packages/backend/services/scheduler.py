@@ -1,151 +1,568 @@
 import time
 import datetime
+import socket
+import threading
+import uuid
 from utils.db_client import supabase # Uses your existing DB client
-from services.social_manager import SocialManager # Assuming this coordinates the uploads
 from services.post_manager import PostManager
 import asyncio
 from routes.publish import get_local_video, get_local_photo
+from utils.publish_limits import PublishLimits
+from utils.due_queue import DueQueue
+from utils.post_listener import PostListener
+from utils.retry import RetryMetrics
+from utils.http_client import HttpClient
+from utils import deadline
+from utils.scratch import ScratchSpace
 import os
 
-async def check_and_publish_photos():
-    # Get current time in ISO8601 format for Supabase comparison
-    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    
-    print(f"[{now}] Checking for scheduled photo posts...")
+# Every scheduler process gets its own identity so claimed rows can be traced
+# back to the worker that owns them.
+WORKER_ID = os.getenv("SCHEDULER_WORKER_ID") or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+# Each scheduled post is fanned out into one post_targets row per platform.
+# Claimed targets are leased. The heartbeat extends the lease every
+# HEARTBEAT_SECONDS while the target is being published; if the process dies
+# the lease runs out and any scheduler puts the target back in the queue.
+# A failed target is retried on its own after RETRY_BASE_SECONDS, doubling
+# every attempt, up to MAX_ATTEMPTS times.
+LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", "30"))
+HEARTBEAT_SECONDS = max(LEASE_SECONDS // 3, 1)
+REAP_INTERVAL_SECONDS = int(os.getenv("SCHEDULER_REAP_INTERVAL_SECONDS", "10"))
+MAX_ATTEMPTS = int(os.getenv("SCHEDULER_MAX_ATTEMPTS", "3"))
+RETRY_BASE_SECONDS = int(os.getenv("SCHEDULER_RETRY_BASE_SECONDS", "60"))
+CLAIM_BATCH_SIZE = int(os.getenv("SCHEDULER_CLAIM_BATCH_SIZE", "10"))
+# Overall time budget for publishing a post's claimed targets (platforms run
+# in parallel, so each target gets the whole budget). Every platform API call
+# gets a timeout derived from what is left; a target that runs out fails
+# fast and is retried like any other failure instead of holding a slot.
+TARGET_BUDGET_SECONDS = int(os.getenv("SCHEDULER_TARGET_BUDGET_SECONDS", "900"))
 
-    # 1. Query Supabase for posts that are 'pending' and ready to go
-    # We use .lte (Less Than or Equal to) to find posts whose time has arrived
-    response = supabase.table("posts") \
-        .select("*") \
+# The due-queue holds posts scheduled (and targets to retry) within the next
+# REFILL_WINDOW_SECONDS and is reloaded every REFILL_INTERVAL_SECONDS.
+# Between refills the loop just sleeps until the next item is due. While the
+# LISTEN connection is up, new posts arrive through notifications and the
+# refill becomes a slow safety net (FALLBACK_REFILL_INTERVAL_SECONDS). Keep
+# the window at least as long as either interval so nothing can slip between
+# two refills.
+REFILL_WINDOW_SECONDS = int(os.getenv("SCHEDULER_REFILL_WINDOW_SECONDS", "600"))
+REFILL_INTERVAL_SECONDS = int(os.getenv("SCHEDULER_REFILL_INTERVAL_SECONDS", "60"))
+FALLBACK_REFILL_INTERVAL_SECONDS = int(os.getenv("SCHEDULER_FALLBACK_REFILL_INTERVAL_SECONDS", "600"))
+REFILL_LIMIT = int(os.getenv("SCHEDULER_REFILL_LIMIT", "1000"))
+CLOCK_SKEW_RETRY_SECONDS = 1
+METRICS_LOG_INTERVAL_SECONDS = int(os.getenv("SCHEDULER_METRICS_LOG_INTERVAL_SECONDS", "300"))
+ERROR_BACKOFF_SECONDS = 10
+
+
+def claim_due_targets(limit: int = CLAIM_BATCH_SIZE, skip_users: list = (), skip_platforms: list = ()) -> list:
+    """
+    Fans due 'pending' posts out into per-platform targets and atomically
+    claims every ready target (first attempts and retries whose
+    next_retry_at has passed) of up to `limit` posts. Posts of `skip_users` or
+    with a target on `skip_platforms` are left alone. The RPC locks rows
+    with FOR UPDATE SKIP LOCKED, so two schedulers never receive the same
+    target.
+    """
+    response = supabase.rpc("claim_due_targets", {
+        "p_worker_id": WORKER_ID,
+        "p_lease_seconds": LEASE_SECONDS,
+        "p_limit": limit,
+        "p_skip_users": [str(user_id) for user_id in skip_users],
+        "p_skip_platforms": list(skip_platforms)
+    }).execute()
+    return response.data or []
+
+
+def release_claimed_targets(target_ids: list):
+    """Hands claimed targets back to the queue without counting an attempt."""
+    supabase.rpc("release_claimed_targets", {
+        "p_worker_id": WORKER_ID,
+        "p_target_ids": target_ids
+    }).execute()
+
+
+def fetch_posts(post_ids) -> dict:
+    response = supabase.table("posts").select("*").in_("id", list(post_ids)).execute()
+    return {post["id"]: post for post in response.data or []}
+
+
+def fetch_due_posts(window_end: str) -> list:
+    return supabase.table("posts") \
+        .select("id, scheduled_at") \
+        .eq("status", "pending") \
+        .lte("scheduled_at", window_end) \
+        .order("scheduled_at") \
+        .limit(REFILL_LIMIT) \
+        .execute().data or []
+
+
+def fetch_due_retries(window_end: str) -> list:
+    return supabase.table("post_targets") \
+        .select("id, next_retry_at") \
         .eq("status", "pending") \
-        .lte("scheduled_at", now) \
+        .or_(f'next_retry_at.is.null,next_retry_at.lte."{window_end}"') \
+        .limit(REFILL_LIMIT) \
+        .execute().data or []
+
+
+def requeue_expired_targets() -> list:
+    """Returns targets whose worker stopped renewing its lease to the queue."""
+    response = supabase.rpc("requeue_expired_targets", {"p_max_attempts": MAX_ATTEMPTS}).execute()
+    for row in response.data or []:
+        print(f"[Scheduler] Lease expired for post {row['post_id']} on {row['platform']} (attempt {row['attempts']}). Now '{row['status']}'.")
+    return response.data or []
+
+
+class LeaseHeartbeat(threading.Thread):
+    """
+    Renews the leases of every target this worker is publishing.
+
+    Runs on its own thread on purpose: ffmpeg and some platform SDKs block
+    the event loop for minutes during big uploads, and the lease must keep
+    being renewed regardless.
+    """
+
+    def __init__(self):
+        super().__init__(name="lease-heartbeat", daemon=True)
+        self.target_ids = set()
+        self.uploads = {}  # target_id -> (loop, task) of its platform upload
+        self.lost = set()
+        self.lock = threading.Lock()
+
+    def track(self, target_id: int):
+        with self.lock:
+            self.target_ids.add(target_id)
+
+    def untrack(self, target_id: int):
+        with self.lock:
+            self.target_ids.discard(target_id)
+            self.uploads.pop(target_id, None)
+            self.lost.discard(target_id)
+
+    def attach(self, target_id: int, task: asyncio.Task):
+        """Registers the upload publishing `target_id`. Called on the event loop."""
+        with self.lock:
+            if target_id in self.lost:
+                task.cancel()
+                return
+            self.uploads[target_id] = (asyncio.get_running_loop(), task)
+
+    def lose(self, target_id: int):
+        """
+        Another scheduler may already be publishing the target, so stop our
+        upload of it before it posts a second time.
+        """
+        with self.lock:
+            self.target_ids.discard(target_id)
+            self.lost.add(target_id)
+            upload = self.uploads.pop(target_id, None)
+        if upload:
+            loop, task = upload
+            loop.call_soon_threadsafe(task.cancel)
+
+    def run(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            with self.lock:
+                target_ids = list(self.target_ids)
+            if not target_ids:
+                continue
+
+            try:
+                response = supabase.rpc("renew_target_leases", {
+                    "p_worker_id": WORKER_ID,
+                    "p_target_ids": target_ids,
+                    "p_lease_seconds": LEASE_SECONDS
+                }).execute()
+                lost = set(target_ids) - set(response.data or [])
+                for target_id in lost:
+                    print(f"[Scheduler] WARNING: lost the lease on target {target_id}. Cancelling its upload.")
+                    self.lose(target_id)
+            except Exception as e:
+                print(f"[Scheduler] Lease renewal failed: {e}")
+
+
+def record_target_result(target: dict, result):
+    """
+    Stores the outcome of one platform upload, but only while this worker
+    still owns the target. Failures are rescheduled with exponential backoff
+    until MAX_ATTEMPTS is reached.
+    Returns the retry time (unix timestamp) if the target was rescheduled.
+    """
+    update = {
+        "claimed_by": None,
+        "lease_expires_at": None,
+        "updated_at": datetime.datetime.now(datetime.timezone.utc).isoformat()
+    }
+    retry_at = None
+
+    if isinstance(result, dict) and result.get("url"):
+        update.update({"status": "published", "result_url": result["url"], "last_error": None})
+    else:
+        update["last_error"] = str(result) if result is not None else "Upload failed"
+        if target["attempts"] < MAX_ATTEMPTS:
+            retry_at = time.time() + RETRY_BASE_SECONDS * 2 ** (target["attempts"] - 1)
+            update.update({
+                "status": "pending",
+                "next_retry_at": datetime.datetime.fromtimestamp(retry_at, datetime.timezone.utc).isoformat()
+            })
+        else:
+            update["status"] = "failed"
+
+    supabase.table("post_targets") \
+        .update(update) \
+        .eq("id", target["id"]) \
+        .eq("claimed_by", WORKER_ID) \
         .execute()
+    return retry_at
 
-    posts_to_publish = response.data
 
-    if not posts_to_publish:
+def cleanup_if_finished(post_id: int):
+    """
+    Once no target of the post is left to publish (or retry), the source
+    media in storage isn't needed anymore.
+    """
+    response = supabase.table("posts") \
+        .select("status, video_path, photo_paths") \
+        .eq("id", post_id) \
+        .maybe_single() \
+        .execute()
+    post = response.data if response else None
+    if not post or post["status"] not in ("published", "failed"):
         return
 
-    for post in posts_to_publish:
-        if not post.get("photo_paths"):
-            continue  # Skip if no photo_paths
-        post_id = post['id']
-        platforms = post['platforms'] 
-        
-        print(f"Publishing Photo Post {post_id} to {platforms}...")
+    try:
+        if post.get("video_path"):
+            supabase.storage.from_("videos").remove([post["video_path"]])
+        if post.get("photo_paths"):
+            supabase.storage.from_("photos").remove(post["photo_paths"])
+        print(f"[Scheduler] Post {post_id} is '{post['status']}'. Removed its source media from storage.")
+    except Exception as e:
+        print(f"Cleanup Error: {str(e)}")
 
-        try:
-            # 2. Update status to 'processing' so no other worker picks it up
-            supabase.table("posts").update({"status": "processing"}).eq("id", post_id).execute()
-
-            # 3. Trigger your social services
-            print(f"Downloading photos: {post['photo_paths']}...")
-            local_paths = []
-            for path in post['photo_paths']:
-                local_path = await get_local_photo(path)
-                local_paths.append(local_path)
-            
-            if local_paths:
-                print(f"Photo download complete.")
-                results = await PostManager.distribute_photos(post_id=post_id, user_id=post['user_id'], file_paths=local_paths, caption=post['caption'], platforms=post['platforms'])
-                # Check if any results contains an Exception/Error
-                errors = [r for r in results if isinstance(r, Exception)]
-                
-                if errors:
-                    print(f"Post {post_id} failed on some platforms: {errors}")
-                    supabase.table("posts").update({"status": "failed"}).eq("id", post_id).execute()
-                else:
-                    supabase.table("posts").update({"status": "published"}).eq("id", post_id).execute()
-                    print(f"Post {post_id} successfully published.")
+
+async def publish_photo_post(post: dict, platforms: list, scratch: ScratchSpace, on_upload=None) -> dict:
+    post_id = post['id']
+
+    print(f"Publishing Photo Post {post_id} to {platforms}...")
+
+    # 1. Trigger your social services
+    print(f"Downloading photos: {post['photo_paths']}...")
+    local_paths = []
+    for path in post['photo_paths']:
+        local_path = await get_local_photo(path, scratch)
+        local_paths.append(local_path)
+
+    if not local_paths:
+        raise FileNotFoundError(f"Could not download photos for post {post_id}")
+
+    print(f"Photo download complete.")
+    return await PostManager.distribute_photos(post_id=post_id, user_id=post['user_id'], file_paths=local_paths, caption=post['caption'], platforms=platforms, scheduled=True, on_upload=on_upload)
+
+
+async def publish_video_post(post: dict, platforms: list, scratch: ScratchSpace, on_upload=None) -> dict:
+    post_id = post['id']
+
+    print(f"Publishing Post {post_id} to {platforms}...")
+
+    # 1. Trigger your social services
+    print(f"Downloading video: {post['video_path']}...")
+    local_path = await get_local_video(post['video_path'], scratch)
+
+    if not os.path.exists(local_path):
+        raise FileNotFoundError(f"Could not find downloaded file at {local_path}")
+
+    print(f"Video downloaded to {local_path}")
+    return await PostManager.distribute_video(
+        post_id=post_id,
+        user_id=post['user_id'],
+        file_path=local_path,
+        caption=post['caption'],
+        description=post['description'],
+        platforms=platforms,
+        scheduled=True,
+        on_upload=on_upload
+    )
+
+
+async def publish_targets(post: dict, targets: list, heartbeat: LeaseHeartbeat) -> list:
+    """
+    Publishes the claimed targets of one post. The media is downloaded and
+    prepared once for all of them, but every platform's result is recorded
+    on its own target. Returns (target_id, retry_at) for rescheduled targets.
+    """
+    post_id = post['id']
+    platforms = [target["platform"] for target in targets]
+    target_ids = {target["platform"]: target["id"] for target in targets}
+
+    def on_upload(platform, task):
+        # Lets the heartbeat cancel this platform if its lease is lost
+        heartbeat.attach(target_ids[platform], task)
+
+    try:
+        # Downloads and renditions live in a private directory that is
+        # removed however the publish ends
+        with deadline.budget(TARGET_BUDGET_SECONDS), ScratchSpace(post_id) as scratch:
+            if post.get("video_path"):
+                results = await publish_video_post(post, platforms, scratch, on_upload)
+            elif post.get("photo_paths"):
+                results = await publish_photo_post(post, platforms, scratch, on_upload)
             else:
-                raise FileNotFoundError(f"Could not find downloaded file at {local_path}")
-            
-           
+                raise ValueError("Post has no media attached")
+            expired = deadline.remaining() <= 0
 
-        except Exception as e:
-            print(f"Failed to publish post {post_id}: {str(e)}")
-            # Mark as failed to debug it later
-            supabase.table("posts").update({"status": "failed"}).eq("id", post_id).execute()
+        if not isinstance(results, dict) or "error" in results:
+            raise RuntimeError(f"Distribution failed: {results}")
+        if expired:
+            # Services swallow their errors, so name the real reason on the target
+            results = {
+                platform: results.get(platform) or deadline.DeadlineExceeded(f"Ran past the {TARGET_BUDGET_SECONDS}s publish budget")
+                for platform in platforms
+            }
+    except Exception as e:
+        print(f"Failed to publish post {post_id}: {str(e)}")
+        results = {platform: e for platform in platforms}
 
+    # The supabase client is synchronous; keep it off the event loop the
+    # other posts' uploads run on
+    retries = []
+    for target in targets:
+        result = results.get(target["platform"])
+        retry_at = await asyncio.to_thread(record_target_result, target, result)
+        if retry_at:
+            print(f"Post {post_id} failed on {target['platform']}. Retrying in {int(retry_at - time.time())}s.")
+            retries.append((target["id"], retry_at))
+        elif isinstance(result, dict) and result.get("url"):
+            print(f"Post {post_id} successfully published to {target['platform']}.")
+        else:
+            print(f"Post {post_id} failed on {target['platform']} after {target['attempts']} attempt(s). Giving up.")
 
+    await asyncio.to_thread(cleanup_if_finished, post_id)
+    return retries
 
 
+class Scheduler:
+    """
+    Long-lived scheduler loop.
 
-async def check_and_publish():
-    # Get current time in ISO8601 format for Supabase comparison
-    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    
-    print(f"[{now}] Checking for scheduled posts...")
+    Upcoming posts and target retries are kept in a DueQueue, refilled from
+    the database in windows. The loop sleeps exactly until the next item is
+    due (or the next refill), claims whatever targets are ready and starts
+    publishing them in the background, bounded by PublishLimits.
+    """
 
-    # 1. Query Supabase for posts that are 'pending' and ready to go
-    # We use .lte (Less Than or Equal to) to find posts whose time has arrived
-    response = supabase.table("posts") \
-        .select("*") \
-        .eq("status", "pending") \
-        .lte("scheduled_at", now) \
-        .execute()
+    def __init__(self):
+        self.queue = DueQueue()
+        self.limits = PublishLimits()
+        self.tasks = set()
+        self.wake = asyncio.Event()
+        self.backlog = False  # ready targets left unclaimed because we were full
+        self.next_refill = 0.0
+        self.next_reap = 0.0
+        self.next_metrics_log = time.time() + METRICS_LOG_INTERVAL_SECONDS
+        self.heartbeat = LeaseHeartbeat()
+        self.listener = PostListener(on_change=self.on_post_changed, on_connect=self.request_refill)
 
-    posts_to_publish = response.data
+    def on_post_changed(self, payload: dict):
+        """Keeps the due-queue in sync with posts_scheduled notifications."""
+        key = f"post:{payload.get('id')}"
+        scheduled_at = payload.get("scheduled_at")
+        if payload.get("status") != "pending" or not scheduled_at:
+            self.queue.discard(key)
+            return
 
-    if not posts_to_publish:
-        return
+        due_at = parse_timestamp(scheduled_at)
+        if due_at - time.time() > REFILL_WINDOW_SECONDS:
+            # Too far out, a later refill will pick it up
+            self.queue.discard(key)
+            return
 
-    for post in posts_to_publish:
-        if not post.get("video_path"):
-            continue  # Skip if no video_path
-        post_id = post['id']
-        platforms = post['platforms'] 
-        
-        print(f"Publishing Post {post_id} to {platforms}...")
+        self.queue.push(key, due_at)
+        self.wake.set()
 
-        try:
-            # 2. Update status to 'processing' so no other worker picks it up
-            supabase.table("posts").update({"status": "processing"}).eq("id", post_id).execute()
-
-            # 3. Trigger your social services
-            print(f"Downloading video: {post['video_path']}...")
-            local_path = await get_local_video(post['video_path'])
-            
-            if os.path.exists(local_path):
-                print(f"Video downloaded to {local_path}")
-                results = await PostManager.distribute_video(
-                    post_id=post_id,
-                    user_id=post['user_id'],
-                    file_path=local_path,
-                    caption=post['caption'],
-                    description=post['description'],
-                    platforms=post['platforms']
-                )
-                # Check if any results contains an Exception/Error
-                errors = [r for r in results if isinstance(r, Exception)]
-                
-                if errors:
-                    print(f"Post {post_id} failed on some platforms: {errors}")
-                    supabase.table("posts").update({"status": "failed"}).eq("id", post_id).execute()
-                else:
-                    supabase.table("posts").update({"status": "published"}).eq("id", post_id).execute()
-                    print(f"Post {post_id} successfully published.")
+    def request_refill(self):
+        # Catch up on anything we missed while the listener was down
+        self.next_refill = 0.0
+        self.wake.set()
+
+    async def refill(self):
+        """Loads every post and target retry due within the next window into the queue."""
+        window_end = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=REFILL_WINDOW_SECONDS)).isoformat()
+        posts = await asyncio.to_thread(fetch_due_posts, window_end)
+        targets = await asyncio.to_thread(fetch_due_retries, window_end)
+
+        for row in posts:
+            self.queue.push(f"post:{row['id']}", parse_timestamp(row["scheduled_at"]))
+        for row in targets:
+            due_at = parse_timestamp(row["next_retry_at"]) if row["next_retry_at"] else time.time()
+            self.queue.push(f"target:{row['id']}", due_at)
+
+        # If the window was truncated, come back as soon as the queue drains
+        self.backlog = self.backlog or len(posts) >= REFILL_LIMIT or len(targets) >= REFILL_LIMIT
+        interval = FALLBACK_REFILL_INTERVAL_SECONDS if self.listener.connected else REFILL_INTERVAL_SECONDS
+        self.next_refill = time.time() + interval
+
+    async def reap(self):
+        self.next_reap = time.time() + REAP_INTERVAL_SECONDS
+        for row in await asyncio.to_thread(requeue_expired_targets):
+            if row["status"] == "pending":
+                self.queue.push(f"target:{row['id']}", time.time())
             else:
-                raise FileNotFoundError(f"Could not find downloaded file at {local_path}")
-            
-           
+                await asyncio.to_thread(cleanup_if_finished, row["post_id"])
 
-        except Exception as e:
-            print(f"Failed to publish post {post_id}: {str(e)}")
-            # Mark as failed to debug it later
-            supabase.table("posts").update({"status": "failed"}).eq("id", post_id).execute()
+    def on_task_done(self, task: asyncio.Task, post: dict, targets: list):
+        self.tasks.discard(task)
+        self.limits.release(post["user_id"], [target["platform"] for target in targets])
+        for target in targets:
+            self.heartbeat.untrack(target["id"])
+
+        if task.cancelled():
+            pass
+        elif task.exception() is not None:
+            # The leases run out and the reaper requeues the targets
+            print(f"Worker Error: {task.exception()}")
+        else:
+            for target_id, retry_at in task.result():
+                self.queue.push(f"target:{target_id}", retry_at)
+
+        # A slot opened up, see if anything is still waiting to be claimed
+        self.wake.set()
+
+    async def claim_and_dispatch(self, due: list):
+        free = self.limits.free_slots()
+        if free == 0:
+            self.backlog = True
+            return
+
+        # Claim targets that are ready to go, leaving out users and platforms
+        # that are already full. Claimed rows are already 'processing' and
+        # owned by this worker. The claim is limited to `free` posts (with
+        # all of their ready targets), so it never starts more than we can run.
+        targets = await asyncio.to_thread(
+            claim_due_targets,
+            limit=free,
+            skip_users=self.limits.saturated_users(),
+            skip_platforms=self.limits.saturated_platforms()
+        )
+        by_post = {}
+        for target in targets:
+            by_post.setdefault(target["post_id"], []).append(target)
+            self.queue.discard(f"target:{target['id']}")
+            self.heartbeat.track(target["id"])
+        self.backlog = len(by_post) >= free
 
-def run_scheduler():
-    # Start the heartbeat
-    while True:
-        print("UniPost Scheduler started...")
         try:
-            asyncio.run(check_and_publish())
-            asyncio.run(check_and_publish_photos())
-        except Exception as e:
-            print(f"Worker Error: {e}")
-        
-        # Wait 60 seconds before checking again
-        time.sleep(60)
-
-run_scheduler()
\ No newline at end of file
+            posts = await asyncio.to_thread(fetch_posts, by_post.keys()) if by_post else {}
+        except Exception:
+            # Stop renewing so the reaper hands the targets to someone else
+            for target in targets:
+                self.heartbeat.untrack(target["id"])
+            raise
+
+        released = False
+        dispatched = set()  # ids of targets a publish task now owns
+        try:
+            for post_id, post_targets in by_post.items():
+                self.queue.discard(f"post:{post_id}")
+                post = posts.get(post_id)
+                if post is None:
+                    # Deleted in the meantime; its targets went with it
+                    for target in post_targets:
+                        self.heartbeat.untrack(target["id"])
+                    continue
+                platforms = [target["platform"] for target in post_targets]
+                if not self.limits.admit(post["user_id"], platforms):
+                    # Filled up by an earlier post of this same claim; don't let
+                    # it hold a lease while it waits
+                    for target in post_targets:
+                        self.heartbeat.untrack(target["id"])
+                    await asyncio.to_thread(release_claimed_targets, [target["id"] for target in post_targets])
+                    released = True
+                    continue
+                task = asyncio.create_task(publish_targets(post, post_targets, self.heartbeat))
+                dispatched.update(target["id"] for target in post_targets)
+                self.tasks.add(task)
+                task.add_done_callback(lambda t, post=post, post_targets=post_targets: self.on_task_done(t, post, post_targets))
+        except Exception:
+            # Stop renewing what no task took over (e.g. the release failed),
+            # so those leases run out and the reaper requeues the targets
+            for target in targets:
+                if target["id"] not in dispatched:
+                    self.heartbeat.untrack(target["id"])
+            raise
+
+        if targets:
+            print(f"[Scheduler] {WORKER_ID} claimed {len(targets)} target(s) across {len(by_post)} post(s), {len(self.tasks)} in flight.")
+
+        # Our clock may run slightly ahead of the database's, in which case an
+        # item we woke up for isn't due yet as far as the claim is concerned.
+        # Look again shortly rather than waiting for the regular refill.
+        claimed = {f"target:{t['id']}" for t in targets} | {f"post:{post_id}" for post_id in by_post}
+        if any(entry.key not in claimed for entry in due):
+            self.next_refill = min(self.next_refill, time.time() + CLOCK_SKEW_RETRY_SECONDS)
+
+        if released:
+            if self.limits.free_slots():
+                # Whatever filled up is skipped now, so other users' posts can
+                # use the slots that are left
+                await self.claim_and_dispatch([])
+            # The released targets are due; claim again once a slot frees up
+            self.backlog = True
+
+    def seconds_until_next_event(self) -> float:
+        next_event = min(self.next_refill, self.next_reap, self.next_metrics_log)
+        next_due = self.queue.next_due()
+        if next_due is not None:
+            next_event = min(next_event, next_due)
+        return max(next_event - time.time(), 0)
+
+    async def run(self):
+        print(f"UniPost Scheduler started as {WORKER_ID}...")
+        ScratchSpace.sweep()
+        self.heartbeat.start()
+        self.listener_task = asyncio.create_task(self.listener.run())
+        while True:
+            try:
+                if time.time() >= self.next_reap:
+                    await self.reap()
+
+                if time.time() >= self.next_refill:
+                    await self.refill()
+
+                if time.time() >= self.next_metrics_log:
+                    self.next_metrics_log = time.time() + METRICS_LOG_INTERVAL_SECONDS
+                    print(f"[Scheduler] Retry metrics: {RetryMetrics.snapshot()}")
+                    print(f"[Scheduler] Scratch disk usage: {ScratchSpace.total_usage()}")
+
+                due = self.queue.pop_due()
+                if due or self.backlog:
+                    await self.claim_and_dispatch(due)
+            except Exception as e:
+                print(f"Worker Error: {e}")
+                # Don't spin on a broken database connection
+                self.next_refill = time.time() + ERROR_BACKOFF_SECONDS
+
+            self.wake.clear()
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=self.seconds_until_next_event())
+            except asyncio.TimeoutError:
+                pass
+
+
+def parse_timestamp(value: str) -> float:
+    return datetime.datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+async def serve():
+    try:
+        await Scheduler().run()
+    finally:
+        await HttpClient.close()
+
+
+def run_scheduler():
+    # One event loop for the lifetime of the process
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    run_scheduler()
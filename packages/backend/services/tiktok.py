@@ -1,13 +1,34 @@
-import os
-import requests
 import math
+import os
 from datetime import datetime, timedelta, timezone
 from utils.db_client import UserManager
+from utils.retry import with_retry, UPLOAD_POLICY
+from utils.http_client import HttpClient
+from utils.media_buffer import MediaBuffer
 import asyncio
 
+# TikTok chunk rules: every chunk is 5-64MB except the last, which absorbs
+# the remainder (so it can reach 128MB). Files up to 64MB may go as a single
+# chunk (files under 5MB must), and an upload has at most 1000 chunks.
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+PREFERRED_CHUNK_SIZE = 10 * 1024 * 1024
+MAX_CHUNK_COUNT = 1000
+
+
+def plan_chunks(video_size: int) -> tuple[int, int]:
+    """Returns (chunk_size, total_chunk_count) for TikTok's FILE_UPLOAD init."""
+    if video_size <= MAX_CHUNK_SIZE:
+        return video_size, 1
+    chunk_size = max(PREFERRED_CHUNK_SIZE, math.ceil(video_size / MAX_CHUNK_COUNT))
+    if chunk_size > MAX_CHUNK_SIZE:
+        raise ValueError(f"Video too large for TikTok: {video_size} bytes")
+    # TikTok counts chunks rounding down; the trailing bytes ride on the last one
+    return chunk_size, video_size // chunk_size
+
+
 class TikTokService:
     @staticmethod
-    def get_valid_token(user_id: str):
+    async def get_valid_token(user_id: str):
         print(f"[Token Check] Fetching tokens for user: {user_id}")
         account = UserManager.get_social_tokens(user_id, "tiktok")
         
@@ -36,7 +57,7 @@ class TikTokService:
             }
             headers = {"Content-Type": "application/x-www-form-urlencoded"}
             
-            response = requests.post(url, data=data, headers=headers)
+            response = await HttpClient.post(url, data=data, headers=headers)
             res_json = response.json()
             
             # 3. Handle Refresh Success
@@ -156,67 +177,17 @@ class TikTokService:
     #         return None
     
     @staticmethod
-    async def upload_video(user_id: str, file_path: str, caption: str):
+    async def upload_video(user_id: str, file_path: str, caption: str, media: MediaBuffer = None):
         try:
             print(f"DEBUG: Starting TikTok Upload for {caption}")
-            token = TikTokService.get_valid_token(user_id)
+            token = await TikTokService.get_valid_token(user_id)
             
 
-            ## WORKING FOR NON WATERMARKED VIDEOS
-            
-            # video_size = os.path.getsize(file_path)
-
-            # # TikTok hard preference
-            # SINGLE_CHUNK_THRESHOLD = 64 * 1024 * 1024  # 64MB
-            # MIN_CHUNK = 5 * 1024 * 1024  # 5MB
-
-            # if video_size < SINGLE_CHUNK_THRESHOLD:
-            #     chunk_size = video_size
-            #     total_chunks = 1
-            # else:
-            #     chunk_size = 10 * 1024 * 1024  # 10MB safe value
-            #     total_chunks = math.ceil(video_size / chunk_size)
-
-            # # Explicit ints (TikTok is strict)
-            # video_size = int(video_size)
-            # chunk_size = int(chunk_size)
-            # total_chunks = int(total_chunks)
-
-            # print(f"[TikTok Upload] size={video_size} chunk={chunk_size} count={total_chunks}")
-
-
-            ## WORKING FOR NON WATERMARKED VIDEOS
-
             video_size = os.path.getsize(file_path)
-
-            SINGLE_CHUNK_LIMIT = 128 * 1024 * 1024  # 128MB — TikTok accepts this
-            PREFERRED_CHUNK = 10 * 1024 * 1024      # 10MB
-
-            # Default: single chunk (SAFE)
-            chunk_size = video_size
-            total_chunks = 1
-
-            # Try multi-chunk ONLY if very large AND divisible
-            if video_size > SINGLE_CHUNK_LIMIT:
-                for chunks in range(2, 50):  # reasonable upper bound
-                    if video_size % chunks == 0:
-                        chunk_size = video_size // chunks
-                        total_chunks = chunks
-                        break
-
-            # Explicit ints
-            video_size = int(video_size)
-            chunk_size = int(chunk_size)
-            total_chunks = int(total_chunks)
+            chunk_size, total_chunks = plan_chunks(video_size)
 
             print(f"[TikTok Upload] size={video_size} chunk={chunk_size} count={total_chunks}")
 
-
-
-
-
-            print(f"[Upload] File: {video_size} | Chunk: {chunk_size} | Count: {total_chunks}")
-
             # STEP 1: Initialize upload
             init_url = "https://open.tiktokapis.com/v2/post/publish/video/init/"
             headers = {
@@ -237,7 +208,10 @@ class TikTokService:
                 }
             }
             
-            response = requests.post(init_url, json=body, headers=headers)
+            response = await with_retry(
+                lambda: HttpClient.post(init_url, json=body, headers=headers),
+                op="tiktok.init"
+            )
             init_res = response.json()
             
             if "data" not in init_res:
@@ -248,22 +222,27 @@ class TikTokService:
             upload_url = init_res["data"]["upload_url"]
 
             # STEP 2: Chunked upload
-            with open(file_path, "rb") as f:
+            # TikTok requires the chunks of one upload in order, so they go
+            # one at a time, streamed straight out of the shared mmap of the file.
+            with MediaBuffer.borrow(media, file_path) as buffer:
                 for i in range(total_chunks):
                     start_byte = i * chunk_size
-                    f.seek(start_byte)
-                    chunk_data = f.read(chunk_size)
-                    
-                    actual_read_size = len(chunk_data)
-                    end_byte = start_byte + actual_read_size - 1
+                    # The last chunk also carries the remainder
+                    end_byte = video_size - 1 if i == total_chunks - 1 else start_byte + chunk_size - 1
 
                     put_headers = {
                         "Content-Type": "video/mp4",
+                        "Content-Length": str(end_byte - start_byte + 1),
                         "Content-Range": f"bytes {start_byte}-{end_byte}/{video_size}"
                     }
 
                     # TikTok upload_url is a pre-signed S3-style URL; it doesn't need the Bearer token
-                    res = requests.put(upload_url, data=chunk_data, headers=put_headers)
+                    # A failed chunk is streamed again on its own, earlier chunks stay uploaded
+                    res = await with_retry(
+                        lambda: HttpClient.put(upload_url, content=buffer.stream(start_byte, end_byte + 1), headers=put_headers),
+                        op="tiktok.chunk",
+                        policy=UPLOAD_POLICY
+                    )
 
                     if res.status_code not in [200, 201, 206]:
                         print(f"DEBUG: Chunk {i} failed. Status: {res.status_code} Body: {res.text}")
@@ -276,7 +255,10 @@ class TikTokService:
             status_url = "https://open.tiktokapis.com/v2/post/publish/status/fetch/"
             status_headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
             # await asyncio.sleep(5)
-            status_res = requests.post(status_url, json={"publish_id": publish_id}, headers=status_headers).json()
+            status_res = (await with_retry(
+                lambda: HttpClient.post(status_url, json={"publish_id": publish_id}, headers=status_headers),
+                op="tiktok.status"
+            )).json()
             
             # # 3. Get the REAL Video ID (public_item_id)
             video_id = status_res.get("data", {}).get("public_item_id")
@@ -1,9 +1,17 @@
+import asyncio
 import os
 import google.oauth2.credentials
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
 from google.auth.transport.requests import Request
 from utils.db_client import UserManager
+from utils.retry import with_retry, UPLOAD_POLICY
+from utils import deadline
+
+# httplib2 waits forever by default
+SOCKET_TIMEOUT_SECONDS = 60
 
 class YouTubeService:
     @staticmethod
@@ -37,7 +45,8 @@ class YouTubeService:
                 "expires_at": creds.expiry.isoformat()
             })
 
-        return build("youtube", "v3", credentials=creds)
+        http = AuthorizedHttp(creds, http=httplib2.Http(timeout=deadline.cap(SOCKET_TIMEOUT_SECONDS)))
+        return build("youtube", "v3", http=http)
 
     @staticmethod
     async def upload_video(user_id: str, file_path: str, caption: str, description: str):
@@ -46,8 +55,9 @@ class YouTubeService:
         resumable chunks to guarantee bit-perfect uploads.
         """
         try:
-            # Get the auto-refreshed YouTube client
-            youtube = YouTubeService.get_authenticated_service(user_id)
+            # googleapiclient is blocking (httplib2), so every call to it runs
+            # in a worker thread instead of stalling the event loop
+            youtube = await asyncio.to_thread(YouTubeService.get_authenticated_service, user_id)
 
             # Define media with 1MB chunks to prevent data loss/compression
             media = MediaFileUpload(
@@ -74,9 +84,11 @@ class YouTubeService:
             )
 
             # Monitor progress to ensure no bits are dropped
+            # After a failed chunk, next_chunk() asks YouTube how far the
+            # upload got and resumes from the last good byte
             response = None
             while response is None:
-                status, response = request.next_chunk()
+                status, response = await with_retry(lambda: asyncio.to_thread(request.next_chunk), op="youtube.chunk", policy=UPLOAD_POLICY)
                 if status:
                     print(f"YouTube Upload: {int(status.progress() * 100)}% complete")
 
@@ -0,0 +1,55 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Timeouts for the remaining blocking `requests` calls (OAuth callbacks):
+# (connect, read) in seconds
+SYNC_REQUEST_TIMEOUT = (10, 30)
+
+# Monotonic time by which the current publish has to be done. A ContextVar,
+# so every task started inside a budget (one per platform) inherits it.
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The time budget of the current publish ran out."""
+
+
+@contextmanager
+def budget(seconds: float):
+    """
+    Gives the code inside `seconds` to finish. Every outbound call made in
+    it gets a timeout no longer than the time that's left. A nested budget
+    can only shorten the outer one.
+    """
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current budget, or None when there is none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check():
+    left = remaining()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded("Publish deadline exceeded")
+
+
+def cap(timeout: Optional[float]) -> Optional[float]:
+    """Shortens a per-call timeout to the time left in the budget."""
+    left = remaining()
+    if left is None:
+        return timeout
+    left = max(left, 0)
+    return left if timeout is None else min(timeout, left)
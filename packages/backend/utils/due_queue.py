@@ -0,0 +1,60 @@
+import heapq
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(slots=True, order=True, frozen=True)
+class DueEntry:
+    """A single upcoming item. Ordered by due time, then key."""
+    due_at: float  # unix timestamp
+    key: str  # e.g. "post:42" or "target:7"
+
+
+class DueQueue:
+    """
+    Small in-memory min-heap of upcoming work keyed by due time: posts by
+    scheduled_at and failed targets by next_retry_at.
+
+    The scheduler only keeps a window of the near future in here and refills
+    it periodically, so the heap stays small. Rescheduled items are handled
+    lazily: the newest due time for a key wins and stale heap entries are
+    dropped when they surface.
+    """
+
+    def __init__(self):
+        self._heap: list[DueEntry] = []
+        self._due_at: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._due_at)
+
+    def push(self, key: str, due_at: float):
+        if self._due_at.get(key) == due_at:
+            return
+        self._due_at[key] = due_at
+        heapq.heappush(self._heap, DueEntry(due_at, key))
+
+    def discard(self, key: str):
+        # The heap entry is skipped once it reaches the top
+        self._due_at.pop(key, None)
+
+    def _drop_stale(self):
+        while self._heap and self._due_at.get(self._heap[0].key) != self._heap[0].due_at:
+            heapq.heappop(self._heap)
+
+    def next_due(self) -> Optional[float]:
+        self._drop_stale()
+        return self._heap[0].due_at if self._heap else None
+
+    def pop_due(self, now: float = None) -> list[DueEntry]:
+        """Removes and returns every entry whose due time has passed."""
+        now = time.time() if now is None else now
+        due = []
+        self._drop_stale()
+        while self._heap and self._heap[0].due_at <= now:
+            entry = heapq.heappop(self._heap)
+            del self._due_at[entry.key]
+            due.append(entry)
+            self._drop_stale()
+        return due
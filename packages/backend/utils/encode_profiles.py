@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from typing import Optional
+
+
+@dataclass(slots=True, frozen=True)
+class EncodeProfile:
+    """How one family of platforms wants its video encoded."""
+    name: str
+    video_filter: Optional[str] = None  # geometry applied before the watermark
+    canvas_filter: Optional[str] = None  # applied after it, e.g. letterboxing
+    crf: int = 23  # lower = bigger, better
+    preset: str = "fast"
+    max_kbps: Optional[int] = None  # bitrate cap; the VBV buffer holds two seconds of it
+    audio_codec: str = "copy"
+    audio_bitrate: Optional[str] = None
+
+    def output_args(self) -> list[str]:
+        """ffmpeg encoder options for one output using this profile."""
+        args = ["-c:v", "libx264", "-preset", self.preset, "-crf", str(self.crf)]
+        if self.max_kbps:
+            args += ["-maxrate", f"{self.max_kbps}k", "-bufsize", f"{self.max_kbps * 2}k"]
+        args += ["-c:a", self.audio_codec]
+        if self.audio_bitrate:
+            args += ["-b:a", self.audio_bitrate]
+        # yuv420p: the pixel format every platform plays; faststart: moov first
+        return args + ["-pix_fmt", "yuv420p", "-movflags", "+faststart"]
+
+
+# Fit within w x h keeping the aspect ratio, scaling small sources up only
+# when `upscale` is set
+def _fit(w: int, h: int, upscale: bool = False) -> str:
+    if upscale:
+        return f"scale={w}:{h}:force_original_aspect_ratio=decrease:force_divisible_by=2"
+    return f"scale='min(iw,{w})':'min(ih,{h})':force_original_aspect_ratio=decrease:force_divisible_by=2"
+
+
+ENCODE_PROFILES = {
+    profile.name: profile for profile in (
+        # What every platform got before profiles existed
+        EncodeProfile("standard"),
+        # YouTube re-encodes everything itself, so give it the best source
+        EncodeProfile("youtube", crf=18),
+        # Reels are 9:16: scale to fill 1080x1920 along one side, so a smaller
+        # vertical video isn't boxed in on all four sides, and letterbox the
+        # other. The watermark goes on the picture, not into the bars. The
+        # Graph API only takes AAC audio.
+        EncodeProfile(
+            "reels",
+            video_filter=_fit(1080, 1920, upscale=True),
+            canvas_filter="pad=1080:1920:(ow-iw)/2:(oh-ih)/2,setsar=1",
+            max_kbps=8000, audio_codec="aac", audio_bitrate="128k"
+        ),
+        # LinkedIn caps upload size: long side at most 1920px, bounded bitrate
+        EncodeProfile(
+            "linkedin",
+            video_filter=_fit(1920, 1920),
+            max_kbps=6000, audio_codec="aac", audio_bitrate="128k"
+        ),
+    )
+}
+
+PLATFORM_PROFILES = {
+    "youtube": "youtube",
+    "instagram": "reels",
+    "tiktok": "standard",
+    "facebook": "standard",
+    "linkedin": "linkedin",
+}
+
+
+def profile_for(platform: str) -> EncodeProfile:
+    return ENCODE_PROFILES[PLATFORM_PROFILES.get(platform, "standard")]
@@ -0,0 +1,149 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import httpx
+
+from utils import deadline
+
+# One pooled, keep-alive client per process for every platform API call.
+# Connections to graph.facebook.com, open.tiktokapis.com, api.linkedin.com...
+# are reused across uploads instead of paying TCP+TLS setup on every call.
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "40"))
+MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "20"))
+# Used as is outside a deadline budget, shortened to the time left inside one
+DEFAULT_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class HttpClient:
+    """
+    Process-wide async HTTP client.
+
+    httpx only limits connections for the whole pool, so requests are also
+    gated per host. One slow platform can then never take every connection
+    away from the others.
+    """
+
+    _client = None
+    _loop = None
+    _host_slots = {}
+
+    @classmethod
+    def client(cls) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        # The pool is bound to the event loop that created it
+        if cls._client is None or cls._loop is not loop:
+            cls._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=60
+                ),
+                timeout=DEFAULT_TIMEOUT,
+                follow_redirects=True
+            )
+            cls._loop = loop
+            cls._host_slots = {}
+        return cls._client
+
+    @classmethod
+    def _host_slot(cls, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).hostname
+        if host not in cls._host_slots:
+            cls._host_slots[host] = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+        return cls._host_slots[host]
+
+    @staticmethod
+    def timeout(default: httpx.Timeout = DEFAULT_TIMEOUT) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=deadline.cap(default.connect),
+            read=deadline.cap(default.read),
+            write=deadline.cap(default.write),
+            pool=deadline.cap(default.pool)
+        )
+
+    @classmethod
+    async def request(cls, method: str, url: str, **kwargs) -> httpx.Response:
+        deadline.check()
+        client = cls.client()
+        kwargs.setdefault("timeout", cls.timeout())
+
+        async def send():
+            async with cls._host_slot(url):
+                return await client.request(method, url, **kwargs)
+
+        # httpx timeouts apply per connect/read/write, so a slow but steady
+        # upload could outlive the budget. Bound the whole call as well.
+        left = deadline.remaining()
+        if left is None:
+            return await send()
+        try:
+            return await asyncio.wait_for(send(), timeout=max(left, 0))
+        except asyncio.TimeoutError:
+            raise deadline.DeadlineExceeded(f"{method} {urlsplit(url).hostname} ran past the publish deadline")
+
+    @classmethod
+    @asynccontextmanager
+    async def stream(cls, method: str, url: str, **kwargs):
+        """
+        Like request(), but the body is read by the caller (e.g. big downloads
+        written to disk chunk by chunk). Timeouts are still capped by the
+        deadline budget.
+        """
+        deadline.check()
+        client = cls.client()
+        kwargs.setdefault("timeout", cls.timeout())
+        async with cls._host_slot(url):
+            async with client.stream(method, url, **kwargs) as response:
+                yield response
+
+    @classmethod
+    async def get(cls, url: str, **kwargs) -> httpx.Response:
+        return await cls.request("GET", url, **kwargs)
+
+    @classmethod
+    async def post(cls, url: str, **kwargs) -> httpx.Response:
+        return await cls.request("POST", url, **kwargs)
+
+    @classmethod
+    async def put(cls, url: str, **kwargs) -> httpx.Response:
+        return await cls.request("PUT", url, **kwargs)
+
+    @classmethod
+    async def close(cls):
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+            cls._loop = None
+
+
+async def file_stream(path: str, offset: int = 0, length: int = None, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Streams `length` bytes of a file starting at `offset` as a request body,
+    so large videos are never loaded into memory at once. Create a new
+    stream for every attempt; a consumed one can't be replayed.
+    """
+    remaining = length if length is not None else os.path.getsize(path) - offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+async def buffer_stream(buffer, start: int = 0, end: int = None, chunk_size: int = STREAM_CHUNK_SIZE):
+    """
+    Streams buffer[start:end] (usually an mmap of the media file) as a
+    request body. Chunks are memoryview slices, so the data is never copied
+    into Python bytes. Create a new stream for every attempt.
+    """
+    end = len(buffer) if end is None else end
+    view = memoryview(buffer)
+    for offset in range(start, end, chunk_size):
+        yield view[offset:min(offset + chunk_size, end)]
@@ -0,0 +1,74 @@
+import mmap
+import os
+import threading
+
+from utils.http_client import buffer_stream
+
+
+class MediaBuffer:
+    """
+    Read-only, mmap-backed handle on one media file, shared by every
+    platform upload of a post.
+
+    The file is mapped once. Uploads stream memoryview slices of the mapping,
+    so five platforms sending the same 500MB video share the file's page
+    cache instead of each holding their own copies.
+
+    Reference counted: the creator holds the first reference, every user
+    takes one with `acquire()`, and `with` releases it. The mapping is closed
+    when the last reference is released.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self._refs = 1
+        self._lock = threading.Lock()
+        self._file = open(path, "rb")
+        self._mmap = None
+        if self.size:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(self._mmap, "madvise"):
+                # Every upload reads front to back; let the kernel read ahead
+                self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+
+    @classmethod
+    def borrow(cls, media: "MediaBuffer", path: str) -> "MediaBuffer":
+        """A reference on the shared `media`, or a private buffer on `path` when there is none."""
+        return media.acquire() if media is not None else cls(path)
+
+    def acquire(self) -> "MediaBuffer":
+        with self._lock:
+            if self._refs == 0:
+                raise ValueError(f"Media buffer for {self.path} is already closed")
+            self._refs += 1
+        return self
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            if self._refs > 0:
+                return
+        self._close()
+
+    def _close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A cancelled upload still holds a slice; the mapping goes
+                # away with the last slice instead
+                pass
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self) -> "MediaBuffer":
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def stream(self, start: int = 0, end: int = None):
+        """Request body for bytes [start, end) of the file. New one per attempt."""
+        buffer = self._mmap if self._mmap is not None else b""
+        return buffer_stream(buffer, start, self.size if end is None else end)
@@ -0,0 +1,184 @@
+import asyncio
+import contextvars
+import os
+from collections import defaultdict
+
+from utils import deadline
+from utils.http_client import HttpClient
+from utils.retry import with_retry
+
+GRAPH_URL = "https://graph.facebook.com/v19.0/"
+# Each container is first checked POLL_INITIAL_DELAY seconds after it is
+# registered, then every round waits POLL_BACKOFF_FACTOR times longer, up to
+# POLL_MAX_DELAY. Photos are usually ready on the first check; long reels
+# aren't polled every couple of seconds for minutes.
+POLL_INITIAL_DELAY = float(os.getenv("META_STATUS_POLL_INITIAL_SECONDS", "1"))
+POLL_BACKOFF_FACTOR = 1.5
+POLL_MAX_DELAY = float(os.getenv("META_STATUS_POLL_MAX_SECONDS", "10"))
+# The Graph API accepts at most 50 ids per `?ids=` request
+STATUS_BATCH_SIZE = 50
+# What Graph answers for an id that is invalid, expired or not ours. Any
+# other error (throttling codes 4/17/32/613, transient 1/2, ...) says
+# nothing about the containers themselves.
+INVALID_OBJECT_CODE = 100
+INVALID_OBJECT_TYPE = "GraphMethodException"
+
+
+class MediaStatusPoller:
+    """
+    One background poller for every Meta media container being processed
+    in this process.
+
+    Uploads register their container ids and wait on futures. Every
+    container has its own next-check time, backed off from POLL_INITIAL_DELAY
+    to POLL_MAX_DELAY. Each round the poller checks the containers that are
+    due in batched `GET /?ids=a,b,c` requests, one batch per access token,
+    and resolves the waiters. Call volume then grows with the number of
+    linked accounts uploading at the same time, not with the number of
+    containers.
+    The poller stops when nothing is pending and starts again on the next
+    registration.
+    """
+
+    _shared = None
+    _loop = None
+
+    def __init__(self):
+        # access token -> media id -> futures of everyone waiting on it
+        self.waiters = defaultdict(lambda: defaultdict(list))
+        # (access token, media id) -> [next check (loop time), current delay]
+        self.schedule = {}
+        self.wake = asyncio.Event()
+        self.task = None
+
+    @classmethod
+    def shared(cls) -> "MediaStatusPoller":
+        loop = asyncio.get_running_loop()
+        if cls._shared is None or cls._loop is not loop:
+            cls._shared = cls()
+            cls._loop = loop
+        return cls._shared
+
+    async def wait(self, media_ids: list[str], token: str, timeout: float):
+        """Waits until every container is FINISHED. Raises on ERROR or timeout."""
+        loop = asyncio.get_running_loop()
+        registered = []
+        for media_id in media_ids:
+            future = loop.create_future()
+            self.waiters[token][media_id].append(future)
+            registered.append((media_id, future))
+            if (token, media_id) not in self.schedule:
+                self.schedule[(token, media_id)] = [loop.time() + POLL_INITIAL_DELAY, POLL_INITIAL_DELAY]
+        # The poller may be sleeping until a later check
+        self.wake.set()
+
+        if self.task is None or self.task.done():
+            # A fresh context, so the poller doesn't inherit the deadline
+            # budget of whichever upload happened to start it
+            self.task = asyncio.create_task(self.run(), context=contextvars.Context())
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(future for _, future in registered)),
+                timeout=deadline.cap(timeout)
+            )
+        except asyncio.TimeoutError:
+            pending = [media_id for media_id, future in registered if future.cancelled() or not future.done()]
+            raise TimeoutError(f"Meta media processing timed out: {pending}")
+        finally:
+            for media_id, future in registered:
+                self.unregister(token, media_id, future)
+
+    def unregister(self, token: str, media_id: str, future: asyncio.Future):
+        futures = self.waiters[token].get(media_id, [])
+        if future in futures:
+            futures.remove(future)
+        if not futures:
+            self.waiters[token].pop(media_id, None)
+            self.schedule.pop((token, media_id), None)
+        if not self.waiters[token]:
+            self.waiters.pop(token, None)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while self.waiters:
+            self.wake.clear()
+            now = loop.time()
+            due = defaultdict(list)  # access token -> media ids to check now
+            for (token, media_id), entry in self.schedule.items():
+                if entry[0] <= now:
+                    due[token].append(media_id)
+                    # Back off before checking, so a failed check is retried
+                    # on the same schedule as an unfinished container
+                    entry[1] = min(entry[1] * POLL_BACKOFF_FACTOR, POLL_MAX_DELAY)
+                    entry[0] = now + entry[1]
+
+            if due:
+                await asyncio.gather(*(self.poll(token, media_ids) for token, media_ids in due.items()))
+                continue
+
+            next_check = min((entry[0] for entry in self.schedule.values()), default=now + POLL_INITIAL_DELAY)
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout=next_check - now)
+            except asyncio.TimeoutError:
+                pass
+
+    async def poll(self, token: str, media_ids: list[str]):
+        for i in range(0, len(media_ids), STATUS_BATCH_SIZE):
+            await self.check(token, media_ids[i:i + STATUS_BATCH_SIZE])
+
+    async def check(self, token: str, batch: list[str]):
+        try:
+            res = (await with_retry(
+                lambda: HttpClient.get(GRAPH_URL, params={
+                    "ids": ",".join(batch),
+                    "fields": "status_code",
+                    "access_token": token
+                }),
+                op="meta.status_batch"
+            )).json()
+        except Exception as e:
+            # Nothing is known about these containers; ask again next round
+            # and let the waiters' own timeout bound it
+            print(f"[MediaStatusPoller] Status check failed, retrying next interval: {e}")
+            return
+
+        if "error" in res:
+            error = res["error"]
+            if not MediaStatusPoller.is_invalid_object(error):
+                # Throttled or a hiccup on Meta's side. Splitting the batch
+                # would only multiply the calls, so treat it like a failed
+                # request and ask again next interval.
+                print(f"[MediaStatusPoller] Status check failed (code {error.get('code')}), retrying next interval: {error.get('message')}")
+                return
+            if len(batch) > 1:
+                # Graph fails the whole ?ids= request when any single id is
+                # invalid or expired, so find out which one it was
+                print(f"[MediaStatusPoller] Batch of {len(batch)} rejected, checking them one by one.")
+                await asyncio.gather(*(self.check(token, [media_id]) for media_id in batch))
+            else:
+                print(f"[MediaStatusPoller] Meta status check failed for {batch[0]}: {error}")
+                self.resolve(token, batch, error=Exception(f"Meta status check failed: {error}"))
+            return
+
+        print(f"[MediaStatusPoller] Checked {len(batch)} container(s) in one request.")
+        for media_id in batch:
+            status = res.get(media_id, {}).get("status_code")
+            if status == "FINISHED":
+                self.resolve(token, [media_id])
+            elif status in ("ERROR", "EXPIRED"):
+                self.resolve(token, [media_id], error=Exception(f"Meta processing error for {media_id}: {status}"))
+
+    @staticmethod
+    def is_invalid_object(error: dict) -> bool:
+        return error.get("code") == INVALID_OBJECT_CODE or error.get("type") == INVALID_OBJECT_TYPE
+
+    def resolve(self, token: str, media_ids: list[str], error: Exception = None):
+        for media_id in media_ids:
+            for future in self.waiters.get(token, {}).get(media_id, []):
+                if future.done():
+                    continue
+                if error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(True)
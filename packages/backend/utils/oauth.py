@@ -1,5 +1,6 @@
 import os
 import requests
+from utils.deadline import SYNC_REQUEST_TIMEOUT
 from datetime import datetime, timedelta
 from typing import Optional
 import hashlib
@@ -122,7 +123,7 @@ class OAuthManager:
             "code_verifier": verifier  # This is why we needed the state/cookie!
         }
         
-        response = requests.post(url, data=data, headers=headers)
+        response = requests.post(url, data=data, headers=headers, timeout=SYNC_REQUEST_TIMEOUT)
         return response.json()
     
     
@@ -143,7 +144,7 @@ class OAuthManager:
         }
         
         try:
-            response = requests.post(url, data=data, headers=headers)
+            response = requests.post(url, data=data, headers=headers, timeout=SYNC_REQUEST_TIMEOUT)
             res_data = response.json()
             
             # TikTok returns error details inside the JSON even with a 200 status
@@ -176,7 +177,7 @@ class OAuthManager:
             "refresh_token": refresh_token,
             "grant_type": "refresh_token",
         }
-        response = requests.post(url, data=data)
+        response = requests.post(url, data=data, timeout=SYNC_REQUEST_TIMEOUT)
         res_json = response.json()
         
         # Calculate new expiry (usually 3600 seconds)
@@ -195,7 +196,7 @@ class OAuthManager:
             "client_secret": self.ig_client_secret,
             "fb_exchange_token": short_lived_token
         }
-        response = requests.get(url, params=params)
+        response = requests.get(url, params=params, timeout=SYNC_REQUEST_TIMEOUT)
         res_json = response.json()
         
         # IG long-lived tokens usually last 60 days (5184000 seconds)
@@ -210,7 +211,7 @@ class OAuthManager:
             "grant_type": "ig_refresh_token",
             "access_token": long_lived_token
         }
-        response = requests.get(url, params=params)
+        response = requests.get(url, params=params, timeout=SYNC_REQUEST_TIMEOUT)
         return response.json()
     
     # --- FACEBOOK / META LOGIC ---
@@ -229,7 +230,7 @@ class OAuthManager:
         }
         
         try:
-            response = requests.get(url, params=params)
+            response = requests.get(url, params=params, timeout=SYNC_REQUEST_TIMEOUT)
             data = response.json()
             
             if "access_token" in data:
@@ -0,0 +1,78 @@
+import asyncio
+import json
+import os
+
+try:
+    import asyncpg
+except ImportError:  # LISTEN/NOTIFY is optional, the scheduler can still poll
+    asyncpg = None
+
+
+class PostListener:
+    """
+    Subscribes to the 'posts_scheduled' Postgres channel (see the
+    notify_posts_scheduled trigger) and hands every payload to `on_change`.
+
+    Supabase's REST API can't LISTEN, so this holds its own connection to
+    SUPABASE_DB_URL and reconnects with a backoff whenever it drops.
+    `on_connect` runs after every (re)connect so the caller can resync
+    anything it missed while disconnected.
+    """
+
+    CHANNEL = "posts_scheduled"
+    PING_INTERVAL_SECONDS = 30
+
+    def __init__(self, on_change, on_connect=None):
+        self.dsn = os.getenv("SUPABASE_DB_URL")
+        self.on_change = on_change
+        self.on_connect = on_connect
+        self.connected = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.dsn) and asyncpg is not None
+
+    def _handle(self, connection, pid, channel, payload):
+        try:
+            self.on_change(json.loads(payload))
+        except Exception as e:
+            print(f"[PostListener] Bad notification {payload}: {e}")
+
+    async def run(self):
+        if not self.enabled:
+            print("[PostListener] SUPABASE_DB_URL or asyncpg missing. Falling back to polling only.")
+            return
+
+        backoff = 1
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                closed = asyncio.Event()
+                connection.add_termination_listener(lambda _conn: closed.set())
+                await connection.add_listener(self.CHANNEL, self._handle)
+
+                self.connected = True
+                backoff = 1
+                print(f"[PostListener] Listening on '{self.CHANNEL}'.")
+                if self.on_connect:
+                    self.on_connect()
+
+                # An idle connection can die silently, so ping it now and then
+                while not closed.is_set():
+                    try:
+                        await asyncio.wait_for(closed.wait(), timeout=self.PING_INTERVAL_SECONDS)
+                    except asyncio.TimeoutError:
+                        await connection.execute("select 1", timeout=10)
+                print("[PostListener] Connection closed.")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"[PostListener] Error: {e}")
+            finally:
+                self.connected = False
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
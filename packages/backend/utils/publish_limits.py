@@ -0,0 +1,70 @@
+import os
+
+
+class PublishLimits:
+    """
+    Bounds how many posts the scheduler publishes at once.
+
+    Three limits apply to every post:
+      - global: total posts in flight in this process
+      - per platform: posts in flight that target a given platform
+      - per user: posts in flight for a single user
+
+    A post is only admitted when it can have all of its slots right away,
+    and nothing ever waits for a slot. A post that can't start is handed
+    back to the queue instead. The claim skips users and platforms that are
+    full (see saturated_users / saturated_platforms), so one user with a
+    backlog can't tie up claims that other users' posts could use.
+    """
+
+    def __init__(self, max_global: int = None, max_per_user: int = None, max_per_platform: int = None):
+        self.max_global = max_global or int(os.getenv("SCHEDULER_MAX_CONCURRENCY", "8"))
+        self.max_per_user = max_per_user or int(os.getenv("SCHEDULER_MAX_PER_USER", "2"))
+        self.max_per_platform = max_per_platform or int(os.getenv("SCHEDULER_MAX_PER_PLATFORM", "4"))
+
+        self._in_flight = 0
+        self._platforms = {}  # platform -> posts in flight
+        self._users = {}  # user_id -> posts in flight
+
+    def platform_limit(self, platform: str) -> int:
+        # e.g. SCHEDULER_MAX_PER_PLATFORM_INSTAGRAM=2 overrides the default
+        override = os.getenv(f"SCHEDULER_MAX_PER_PLATFORM_{platform.upper()}")
+        return int(override) if override else self.max_per_platform
+
+    def free_slots(self) -> int:
+        """How many more posts can start right now."""
+        return max(self.max_global - self._in_flight, 0)
+
+    def saturated_users(self) -> list:
+        return [user_id for user_id, count in self._users.items() if count >= self.max_per_user]
+
+    def saturated_platforms(self) -> list:
+        return [platform for platform, count in self._platforms.items() if count >= self.platform_limit(platform)]
+
+    def admit(self, user_id: str, platforms: list) -> bool:
+        """
+        Takes a global, per-user and per-platform slot for a post if all of
+        them are free, and returns whether it did. Every admitted post must
+        be released().
+        """
+        platforms = set(platforms)
+        if (self._in_flight >= self.max_global
+                or self._users.get(user_id, 0) >= self.max_per_user
+                or any(self._platforms.get(p, 0) >= self.platform_limit(p) for p in platforms)):
+            return False
+
+        self._in_flight += 1
+        self._users[user_id] = self._users.get(user_id, 0) + 1
+        for platform in platforms:
+            self._platforms[platform] = self._platforms.get(platform, 0) + 1
+        return True
+
+    def release(self, user_id: str, platforms: list):
+        self._in_flight -= 1
+        self._users[user_id] -= 1
+        if self._users[user_id] == 0:
+            del self._users[user_id]
+        for platform in set(platforms):
+            self._platforms[platform] -= 1
+            if self._platforms[platform] == 0:
+                del self._platforms[platform]
@@ -0,0 +1,137 @@
+import asyncio
+import inspect
+import random
+import threading
+from collections import defaultdict
+
+import httpx
+
+from utils import deadline
+
+# Statuses that mean "try again later" on every platform we talk to
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class RetryPolicy:
+    """
+    How often and how long to retry one kind of call.
+
+    Waits use exponential backoff with full jitter: attempt n sleeps a random
+    time between 0 and min(max_delay, base_delay * 2**(n-1)), so many uploads
+    failing together don't all come back at the same moment.
+
+    `idempotent=False` is for calls that must not run twice (publishing a
+    post, creating a share). Those are only retried when we know the request
+    never reached the platform or was rejected before processing (connect
+    failures and 429s).
+    """
+
+    def __init__(self, max_attempts: int = 4, base_delay: float = 1.0, max_delay: float = 30.0, idempotent: bool = True):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.idempotent = idempotent
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+DEFAULT_POLICY = RetryPolicy()
+# For chunk and part uploads: more patience, a failed chunk is cheap to resend
+UPLOAD_POLICY = RetryPolicy(max_attempts=6, base_delay=2.0, max_delay=60.0)
+# For publish / create-post calls
+PUBLISH_POLICY = RetryPolicy(max_attempts=3, base_delay=2.0, idempotent=False)
+
+
+class RetryMetrics:
+    """Process-wide retry counters per operation, e.g. 'tiktok.chunk'."""
+
+    _lock = threading.Lock()
+    _counters = defaultdict(lambda: {"calls": 0, "retries": 0, "wait_seconds": 0.0, "give_ups": 0})
+
+    @classmethod
+    def record(cls, op: str, calls: int = 0, retries: int = 0, wait_seconds: float = 0.0, give_ups: int = 0):
+        with cls._lock:
+            counter = cls._counters[op]
+            counter["calls"] += calls
+            counter["retries"] += retries
+            counter["wait_seconds"] += wait_seconds
+            counter["give_ups"] += give_ups
+
+    @classmethod
+    def snapshot(cls) -> dict:
+        with cls._lock:
+            return {op: {**counter, "wait_seconds": round(counter["wait_seconds"], 2)} for op, counter in cls._counters.items()}
+
+
+def is_retryable_error(error: Exception, policy: RetryPolicy) -> bool:
+    # The request never left this machine, so it is safe to send again
+    if isinstance(error, (httpx.ConnectTimeout, httpx.ConnectError, httpx.PoolTimeout)):
+        return True
+    if not policy.idempotent:
+        return False
+    if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    # googleapiclient.errors.HttpError carries the response as .resp
+    status = getattr(getattr(error, "resp", None), "status", None)
+    return status is not None and int(status) in RETRYABLE_STATUS
+
+
+def is_retryable_response(response, policy: RetryPolicy) -> bool:
+    status = getattr(response, "status_code", None)
+    if status == 429:
+        return True
+    return policy.idempotent and status in RETRYABLE_STATUS
+
+
+def retry_after(response) -> float:
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def has_time_for(delay: float) -> bool:
+    left = deadline.remaining()
+    return left is None or delay < left
+
+
+async def with_retry(call, op: str, policy: RetryPolicy = DEFAULT_POLICY):
+    """
+    Runs `call()` (sync or async) and retries it according to `policy`.
+
+    A call is retried when it raises a transient network error or returns a
+    response with a retryable status. When attempts run out, or the next
+    wait would run past the current deadline budget, the last response is
+    returned (or the last error raised) so callers keep handling failures
+    exactly as before.
+    """
+    attempt = 1
+    while True:
+        deadline.check()
+        RetryMetrics.record(op, calls=1)
+        try:
+            result = call()
+            if inspect.isawaitable(result):
+                result = await result
+        except Exception as e:
+            if not is_retryable_error(e, policy):
+                raise
+            reason, delay = repr(e), policy.backoff(attempt)
+            if attempt >= policy.max_attempts or not has_time_for(delay):
+                RetryMetrics.record(op, give_ups=1)
+                raise
+        else:
+            if not is_retryable_response(result, policy):
+                return result
+            reason = f"HTTP {result.status_code}"
+            delay = max(policy.backoff(attempt), min(retry_after(result), policy.max_delay))
+            if attempt >= policy.max_attempts or not has_time_for(delay):
+                RetryMetrics.record(op, give_ups=1)
+                return result
+
+        RetryMetrics.record(op, retries=1, wait_seconds=delay)
+        print(f"[Retry] {op} attempt {attempt}/{policy.max_attempts} failed ({reason}). Retrying in {delay:.1f}s...")
+        await asyncio.sleep(delay)
+        attempt += 1
@@ -0,0 +1,44 @@
+import httpx
+
+from utils.http_client import HttpClient
+from utils.media_buffer import MediaBuffer
+from utils.retry import with_retry, UPLOAD_POLICY
+
+
+async def session_offset(upload_url: str, authorization: str, size: int) -> int:
+    """
+    How many bytes Meta already holds for a rupload session. A GET on the
+    upload URL answers with the session's `offset`. Falls back to 0 (resend
+    everything) when that can't be read.
+    """
+    try:
+        res = (await HttpClient.get(upload_url, headers={"Authorization": authorization})).json()
+        return min(max(int(res["offset"]), 0), size)
+    except (httpx.HTTPError, ValueError, KeyError, TypeError) as e:
+        print(f"[Rupload] Couldn't read the session offset, resending from 0: {e!r}")
+        return 0
+
+
+async def upload(upload_url: str, authorization: str, buffer: MediaBuffer, op: str) -> httpx.Response:
+    """
+    Pushes a whole file to a Meta rupload session (Instagram and Facebook
+    Reels). A retry first asks the session how far the last attempt got and
+    only sends the rest, with the `offset` header, instead of the whole
+    video again.
+    """
+    offset = None
+
+    async def attempt():
+        nonlocal offset
+        offset = 0 if offset is None else await session_offset(upload_url, authorization, buffer.size)
+        if offset:
+            print(f"[Rupload] Resuming {op} at byte {offset} of {buffer.size}.")
+        return await HttpClient.post(upload_url, content=buffer.stream(offset), headers={
+            "Authorization": authorization,
+            "offset": str(offset),
+            "file_size": str(buffer.size),
+            "Content-Length": str(buffer.size - offset),
+            "Content-Type": "application/octet-stream"
+        })
+
+    return await with_retry(attempt, op=op, policy=UPLOAD_POLICY)
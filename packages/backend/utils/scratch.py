@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Every post gets its own directory under SCRATCH_ROOT for downloads and
+# renditions, so two posts with the same file names can never touch each
+# other's files. Directories left behind by a crashed process are removed
+# by sweep() once they are older than SCRATCH_MAX_AGE_SECONDS.
+SCRATCH_ROOT = Path(os.getenv("SCRATCH_DIR") or Path(tempfile.gettempdir()) / "unipost-scratch")
+SCRATCH_MAX_AGE_SECONDS = int(os.getenv("SCRATCH_MAX_AGE_SECONDS", str(6 * 3600)))
+
+
+class ScratchSpace:
+    """
+    Private working directory for one post.
+
+    Use as a context manager (or call cleanup()) so the directory and
+    everything written into it are removed however the post ends.
+    """
+
+    _lock = threading.Lock()
+    _active = {}  # path -> ScratchSpace, for disk usage reporting
+
+    def __init__(self, label):
+        SCRATCH_ROOT.mkdir(parents=True, exist_ok=True)
+        self.path = Path(tempfile.mkdtemp(prefix=f"post-{label}-", dir=SCRATCH_ROOT))
+        with self._lock:
+            self._active[self.path] = self
+
+    def file(self, name: str) -> str:
+        """A fresh path in this directory for `name` (storage folders are dropped)."""
+        base = os.path.basename(name)
+        path = self.path / base
+        stem, ext = os.path.splitext(base)
+        n = 1
+        while path.exists():
+            path = self.path / f"{stem}-{n}{ext}"
+            n += 1
+        return str(path)
+
+    def usage(self) -> int:
+        """Bytes currently on disk in this directory."""
+        total = 0
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+
+    def cleanup(self):
+        with self._lock:
+            if self._active.pop(self.path, None) is None:
+                return
+        used = self.usage()
+        shutil.rmtree(self.path, ignore_errors=True)
+        print(f"[Scratch] Removed {self.path.name} ({used / (1024 * 1024):.1f}MB)")
+
+    def __enter__(self) -> "ScratchSpace":
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+    @classmethod
+    def total_usage(cls) -> dict:
+        """Disk used by every live scratch directory of this process."""
+        with cls._lock:
+            spaces = list(cls._active.values())
+        return {"directories": len(spaces), "bytes": sum(space.usage() for space in spaces)}
+
+    @staticmethod
+    def sweep(max_age: int = SCRATCH_MAX_AGE_SECONDS):
+        """Removes scratch directories abandoned by processes that died mid-post."""
+        if not SCRATCH_ROOT.exists():
+            return
+        cutoff = time.time() - max_age
+        for entry in SCRATCH_ROOT.iterdir():
+            try:
+                if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                    shutil.rmtree(entry, ignore_errors=True)
+                    print(f"[Scratch] Swept stale directory {entry.name}")
+            except OSError:
+                pass
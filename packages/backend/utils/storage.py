@@ -0,0 +1,79 @@
+import asyncio
+import os
+
+from utils.db_client import supabase
+from utils.http_client import HttpClient
+from utils.retry import with_retry, UPLOAD_POLICY
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+SIGNED_URL_TTL_SECONDS = 3600
+PROGRESS_LOG_STEP = 0.1  # log every 10%
+
+
+async def download_object(bucket: str, object_path: str, local_path: str, on_progress=None) -> int:
+    """
+    Streams a storage object to `local_path` and returns its size.
+
+    The object is fetched through a signed URL in DOWNLOAD_CHUNK_SIZE pieces
+    and written to disk as it arrives, so memory stays flat no matter how big
+    the video is and the event loop keeps serving requests meanwhile. A
+    dropped connection resumes with a Range request from the last byte
+    written. Data lands in `<local_path>.part` and is only moved into place
+    once complete. `on_progress(done_bytes, total_bytes)` is called per chunk.
+    """
+    signed = await asyncio.to_thread(
+        lambda: supabase.storage.from_(bucket).create_signed_url(object_path, SIGNED_URL_TTL_SECONDS)
+    )
+    url = signed.get("signedURL") or signed.get("signedUrl")
+    if not url:
+        raise Exception(f"Could not sign {bucket}/{object_path}: {signed}")
+
+    part_path = local_path + ".part"
+    written = 0
+    total = None
+    next_log = PROGRESS_LOG_STEP
+
+    try:
+        with open(part_path, "wb") as f:
+            async def fetch():
+                nonlocal written, total, next_log
+                headers = {"Range": f"bytes={written}-"} if written else {}
+                async with HttpClient.stream("GET", url, headers=headers) as response:
+                    if response.status_code not in (200, 206):
+                        await response.aread()
+                        return response
+                    if response.status_code == 200 and written:
+                        # Range ignored: start over
+                        f.seek(0)
+                        f.truncate()
+                        written = 0
+                    if total is None:
+                        content_range = response.headers.get("Content-Range", "")
+                        if "/" in content_range and not content_range.endswith("*"):
+                            total = int(content_range.rsplit("/", 1)[1])
+                        elif response.headers.get("Content-Length"):
+                            total = int(response.headers["Content-Length"])
+
+                    async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+                        written += len(chunk)
+                        if on_progress:
+                            on_progress(written, total)
+                        if total and written / total >= next_log:
+                            print(f"[Download] {object_path}: {int(written / total * 100)}% ({written // (1024 * 1024)}MB)")
+                            next_log += PROGRESS_LOG_STEP
+                    return response
+
+            response = await with_retry(fetch, op="storage.download", policy=UPLOAD_POLICY)
+
+        if response.status_code not in (200, 206):
+            raise Exception(f"Download of {bucket}/{object_path} failed: HTTP {response.status_code} {response.text}")
+        if total is not None and written != total:
+            raise Exception(f"Download of {bucket}/{object_path} is incomplete: {written}/{total} bytes")
+    except BaseException:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+        raise
+
+    os.replace(part_path, local_path)
+    return written
@@ -1,149 +1,206 @@
 
+import asyncio
 import subprocess
 import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from PIL import Image, ImageOps
+
+from utils import watermark as watermark_overlay
+from utils.encode_profiles import PLATFORM_PROFILES, profile_for
+
+JPEG_QUALITY = 95  # about what ffmpeg's -q:v 2 gives
+
+# Photo renditions, and the file name suffix each one is written with
+PHOTO_SQUARE = "square"                  # clean square crop
+PHOTO_SQUARE_BRANDED = "square_branded"  # square crop with the watermark
+PHOTO_FULL_BRANDED = "full_branded"      # full frame with the watermark
+PHOTO_RENDITION_SUFFIXES = {
+    PHOTO_SQUARE: "_cropped",
+    PHOTO_SQUARE_BRANDED: "_cropped_watermarked",
+    PHOTO_FULL_BRANDED: "_watermarked",
+}
+# Instagram only takes the square crops; Facebook and LinkedIn take the full
+# frame (the untouched original when the user has no watermark)
+SQUARE_PHOTO_PLATFORMS = {"instagram"}
+FULL_FRAME_PHOTO_PLATFORMS = {"facebook", "linkedin"}
+
+# Photos are rendered in-process by Pillow, which releases the GIL while it
+# decodes, composites and encodes, so a pool of threads keeps every core busy
+PHOTO_RENDER_WORKERS = int(os.getenv("PHOTO_RENDER_WORKERS", str(os.cpu_count() or 2)))
+_render_pool = ThreadPoolExecutor(max_workers=PHOTO_RENDER_WORKERS, thread_name_prefix="photo-render")
+
+
 class VideoProcessor:
     @staticmethod
-    def add_unipost_watermark(input_path: str, output_path: str):
-        # Absolute path to logo
-        base_dir = Path(__file__).resolve().parents[1]
-        logo_path = str(base_dir / "assets" / "logo.png")
-        
-        if not os.path.exists(logo_path):
-            print(f"ERROR: Logo not found at {logo_path}")
-            return input_path
-        opacity = 0.5
-        # FFmpeg filter: scale logo, overlay logo, add text
-        # filter_str = (
-        #     "[1:v]scale=150:-1[logo]; "  # Resize logo to 150px wide
-        #     "[0:v][logo]overlay=W-w-20:H-h-60[v_logo]; "  # Overlay logo
-        #     "[v_logo]drawtext=text='UniPost on iOS':fontcolor=white:fontsize=20:x=W-tw-20:y=H-th-20"
-        # )
-        filter_str = (
-            f"[1:v]scale=150:-1,format=rgba,colorchannelmixer=aa={opacity}[logo]; "
-            "[0:v][logo]overlay=W-w-20:H-h-60[v_logo]; "
-            "[v_logo]drawtext=text='UniCore on iOS':fontcolor=white@0.5:fontsize=20:x=W-tw-20:y=H-th-20"
-        )
+    def render_video(input_path: str, platforms: list) -> dict:
+        """
+        Writes the watermarked video for every platform in one ffmpeg run and
+        returns {platform: path}.
+
+        Each platform gets the encode of its profile (see encode_profiles).
+        Platforms sharing a profile share one output. The source is decoded
+        once and split inside the filter graph, and each branch is fitted to
+        its profile, branded with the cached overlay and then placed on its
+        profile's canvas before it is encoded. If anything fails every
+        platform falls back to the original.
+        """
+        if not watermark_overlay.LOGO_PATH.exists():
+            print(f"ERROR: Logo not found at {watermark_overlay.LOGO_PATH}")
+            return {platform: input_path for platform in platforms}
+
+        platforms = [platform for platform in platforms if platform in PLATFORM_PROFILES]
+        if not platforms:
+            return {}
+        profiles = {}
+        for platform in platforms:
+            profile = profile_for(platform)
+            profiles.setdefault(profile.name, profile)
+        path_obj = Path(input_path)
+        outputs = {
+            name: str(path_obj.with_name(f"{path_obj.stem}_{name}.mp4"))
+            for name in profiles
+        }
+
+        count = len(profiles)
+        graph = [
+            f"[0:v]split={count}" + "".join(f"[v_{name}]" for name in profiles),
+            f"[1:v]split={count}" + "".join(f"[mark_{name}]" for name in profiles),
+        ]
+        for name, profile in profiles.items():
+            source = f"[v_{name}]"
+            if profile.video_filter:
+                graph.append(f"{source}{profile.video_filter}[fit_{name}]")
+                source = f"[fit_{name}]"
+            canvas = f",{profile.canvas_filter}" if profile.canvas_filter else ""
+            graph.append(f"{source}[mark_{name}]overlay=W-w:H-h{canvas}[out_{name}]")
 
         command = [
             "ffmpeg", "-y",
             "-i", input_path,
-            "-i", logo_path,
-            "-filter_complex", filter_str,
-            "-c:a", "copy",  # Copy audio (no re-encode)
-            "-c:v", "libx264",  # Encode video
-            "-preset", "fast",   # Faster encoding, less compression overhead
-            "-crf", "23",        # Constant Rate Factor: controls quality/size (lower = bigger, higher = smaller)
-            "-pix_fmt", "yuv420p",  # TikTok-compatible pixel format
-            "-movflags", "+faststart",  # Good for streaming
-            output_path
+            "-i", watermark_overlay.overlay_path(),
+            "-filter_complex", "; ".join(graph),
         ]
+        for name, profile in profiles.items():
+            command += ["-map", f"[out_{name}]", "-map", "0:a?", *profile.output_args(), outputs[name]]
 
-        print("DEBUG: Processing watermark and text with controlled bitrate...")
+        print(f"DEBUG: Encoding {list(profiles)} from one decode of {input_path}...")
         try:
             subprocess.run(command, check=True, capture_output=True, text=True)
-            print(f"Watermark added: {output_path}")
-            return output_path
         except subprocess.CalledProcessError as e:
             print(f"FFmpeg Error: {e.stderr}")
-            return input_path  # Fallback to original if something fails
-        
+            for path in outputs.values():
+                if os.path.exists(path):
+                    os.remove(path)
+            return {platform: input_path for platform in platforms}  # Fallback to original
+
+        print(f"Watermarked renditions written: {list(outputs.values())}")
+        return {platform: outputs[profile_for(platform).name] for platform in platforms}
+
     @staticmethod
-    def add_photo_watermark(photo_paths: list[str]) -> list[str]:
-        base_dir = Path(__file__).resolve().parents[1]
-        logo_path = str(base_dir / "assets" / "logo.png")
-
-        if not os.path.exists(logo_path):
-            print(f"ERROR: Logo not found at {logo_path}")
-            return photo_paths
-
-        opacity = 0.5
-        output_paths = []
-
-        for input_path in photo_paths:
-            if not os.path.exists(input_path):
-                print(f"Skipping missing file: {input_path}")
-                output_paths.append(input_path)
-                continue
-
-            input_path = str(input_path)
-            output_path = input_path.replace(".jpg", "_watermarked.jpg")
-
-            filter_str = (
-                f"[1:v]scale=150:-1,format=rgba,colorchannelmixer=aa={opacity}[logo]; "
-                "[0:v][logo]overlay=W-w-20:H-h-60[v_logo]; "
-                "[v_logo]drawtext=text='UniCore on iOS':"
-                "fontcolor=white@0.5:fontsize=20:x=W-tw-20:y=H-th-20"
-            )
+    def plan_photo_renditions(platforms: list, watermark: bool) -> set[str]:
+        """The renditions a photo post to `platforms` actually uploads."""
+        if watermark and not watermark_overlay.LOGO_PATH.exists():
+            print(f"ERROR: Logo not found at {watermark_overlay.LOGO_PATH}")
+            watermark = False
+
+        renditions = set()
+        if SQUARE_PHOTO_PLATFORMS.intersection(platforms):
+            renditions.add(PHOTO_SQUARE_BRANDED if watermark else PHOTO_SQUARE)
+        if watermark and FULL_FRAME_PHOTO_PLATFORMS.intersection(platforms):
+            renditions.add(PHOTO_FULL_BRANDED)
+        return renditions
 
-            # command = [
-            #     "ffmpeg", "-y",
-            #     "-i", input_path,
-            #     "-i", logo_path,
-            #     "-filter_complex", filter_str,
-            #     "-frames:v", "1",        # single-frame video
-            #     "-c:v", "libx264",
-            #     "-pix_fmt", "yuv420p",   # social-platform safe
-            #     "-movflags", "+faststart",
-            #     output_path
-            # ]
-            command = [
-                "ffmpeg", "-y",
-                "-i", input_path,
-                "-i", logo_path,
-                "-filter_complex", filter_str,
-                # REMOVED: -frames:v 1
-                # REMOVED: -c:v libx264 (This was the culprit)
-                # REMOVED: -movflags +faststart
-                "-q:v", "2",  # Quality scale (2-5 is high quality for JPEGs)
-                output_path
-            ]
-
-
-            try:
-                subprocess.run(command, check=True, capture_output=True, text=True)
-                print(f"Watermark added: {output_path}")
-                output_paths.append(output_path)
-            except subprocess.CalledProcessError as e:
-                print(f"FFmpeg Error for {input_path}: {e.stderr}")
-                output_paths.append(input_path)
-
-        return output_paths
-    
     @staticmethod
-    def process_photo_for_social(input_path: str):
+    def render_photo(input_path: str, renditions: set[str]) -> dict:
+        """
+        Writes the requested renditions of a photo (see
+        plan_photo_renditions) and returns {rendition: path}.
+
+        The source is decoded once and every output is encoded straight from
+        it, never from another JPEG. Pillow does the work in-process; formats
+        it can't read go through a single ffmpeg run instead.
+        """
+        if not renditions:
+            return {}
         path_obj = Path(input_path)
-        # These create the local filenames
-        clean_out = str(path_obj.with_name(f"{path_obj.stem}_cropped.jpg"))
-        branded_out = str(path_obj.with_name(f"{path_obj.stem}_cropped_watermarked.jpg"))
-        
+        outputs = {
+            rendition: str(path_obj.with_name(f"{path_obj.stem}{suffix}.jpg"))
+            for rendition, suffix in PHOTO_RENDITION_SUFFIXES.items()
+            if rendition in renditions
+        }
+
+        try:
+            image = Image.open(input_path)
+            image.load()
+        except OSError as e:
+            print(f"DEBUG: Pillow can't read {input_path} ({e}), rendering with ffmpeg")
+            return VideoProcessor._render_photo_ffmpeg(input_path, outputs)
+
+        with image:
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            if PHOTO_SQUARE in outputs or PHOTO_SQUARE_BRANDED in outputs:
+                side = min(image.width, image.height)
+                left, top = (image.width - side) // 2, (image.height - side) // 2
+                square = image.crop((left, top, left + side, top + side))
+                if PHOTO_SQUARE in outputs:
+                    square.save(outputs[PHOTO_SQUARE], "JPEG", quality=JPEG_QUALITY)
+                if PHOTO_SQUARE_BRANDED in outputs:
+                    watermark_overlay.apply(square).save(outputs[PHOTO_SQUARE_BRANDED], "JPEG", quality=JPEG_QUALITY)
+            if PHOTO_FULL_BRANDED in outputs:
+                watermark_overlay.apply(image).save(outputs[PHOTO_FULL_BRANDED], "JPEG", quality=JPEG_QUALITY)
+
+        print(f"Photo renditions written: {list(outputs.values())}")
+        return outputs
+
+    @staticmethod
+    async def render_photos(input_paths: list[str], renditions: set[str]) -> list[dict]:
+        """render_photo() for every photo of a post, in parallel on the render pool."""
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(
+            loop.run_in_executor(_render_pool, VideoProcessor.render_photo, path, renditions)
+            for path in input_paths
+        ))
+
+    @staticmethod
+    def _render_photo_ffmpeg(input_path: str, outputs: dict) -> dict:
+        """render_photo() for sources Pillow can't decode, in a single ffmpeg run."""
         # Square crop filter
         crop_filter = "crop='min(iw,ih)':'min(iw,ih)'"
-        
-        # 1. Create Clean Crop locally
-        subprocess.run([
-            "ffmpeg", "-y", "-i", input_path,
-            "-vf", f"{crop_filter},format=yuvj420p", 
-            "-q:v", "2", clean_out
-        ], check=True, capture_output=True)
-
-        # 2. Create Branded Crop locally
-        logo_path = str(Path(__file__).resolve().parents[1] / "assets" / "logo.png")
-        # filter_complex = (
-        #     f"[1:v]scale=150:-1,format=rgba,colorchannelmixer=aa=0.5[logo]; "
-        #     "[0:v][logo]overlay=W-w-20:H-h-60"
-        # )
-        filter_complex = (
-            f"[1:v]scale=150:-1,format=rgba,colorchannelmixer=aa=0.5[logo]; "
-            "[0:v][logo]overlay=W-w-20:H-h-60[v_logo]; "
-            "[v_logo]drawtext=text='UniCore on iOS':"
-            "fontcolor=white@0.5:fontsize=20:x=W-tw-20:y=H-th-20"
-        )
-        subprocess.run([
-            "ffmpeg", "-y", "-i", clean_out, "-i", logo_path,
-            "-filter_complex", filter_complex, 
-            "-pix_fmt", "yuvj420p", "-q:v", "2", branded_out
-        ], check=True, capture_output=True)
-
-        return clean_out, branded_out
\ No newline at end of file
+
+        square = [r for r in (PHOTO_SQUARE, PHOTO_SQUARE_BRANDED) if r in outputs]
+        branded = [r for r in (PHOTO_SQUARE_BRANDED, PHOTO_FULL_BRANDED) if r in outputs]
+        frames = (["sq"] if square else []) + (["full"] if PHOTO_FULL_BRANDED in outputs else [])
+
+        # Decode once, split into just the branches the requested outputs need
+        graph = [f"[0:v]split={len(frames)}" + "".join(f"[{frame}]" for frame in frames)]
+        if branded:
+            graph.append(f"[1:v]split={len(branded)}" + "".join(f"[mark_{r}]" for r in branded))
+        if square:
+            graph.append(f"[sq]{crop_filter},split={len(square)}" + "".join(f"[sq_{r}]" for r in square))
+        if PHOTO_SQUARE in outputs:
+            graph.append(f"[sq_{PHOTO_SQUARE}]format=yuvj420p[out_{PHOTO_SQUARE}]")
+        if PHOTO_SQUARE_BRANDED in outputs:
+            graph.append(
+                f"[sq_{PHOTO_SQUARE_BRANDED}][mark_{PHOTO_SQUARE_BRANDED}]"
+                f"overlay=W-w:H-h,format=yuvj420p[out_{PHOTO_SQUARE_BRANDED}]"
+            )
+        if PHOTO_FULL_BRANDED in outputs:
+            graph.append(f"[full][mark_{PHOTO_FULL_BRANDED}]overlay=W-w:H-h[out_{PHOTO_FULL_BRANDED}]")
+
+        command = ["ffmpeg", "-y", "-i", input_path]
+        if branded:
+            command += ["-i", watermark_overlay.overlay_path()]
+        command += ["-filter_complex", "; ".join(graph)]
+        for rendition, path in outputs.items():
+            command += ["-map", f"[out_{rendition}]", "-q:v", "2", path]
+
+        try:
+            subprocess.run(command, check=True, capture_output=True, text=True)
+        except subprocess.CalledProcessError as e:
+            print(f"FFmpeg Error for {input_path}: {e.stderr}")
+            raise
+
+        print(f"Photo renditions written: {list(outputs.values())}")
+        return outputs
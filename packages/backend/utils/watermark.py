@@ -0,0 +1,114 @@
+import hashlib
+import os
+import tempfile
+import threading
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageFont
+
+LOGO_PATH = Path(__file__).resolve().parents[1] / "assets" / "logo.png"
+WATERMARK_OPACITY = 0.5
+WATERMARK_LOGO_WIDTH = 150
+WATERMARK_TEXT = "UniCore on iOS"
+WATERMARK_FONT_SIZE = 20
+# DejaVu Sans is what ffmpeg's drawtext picks by default in our image
+WATERMARK_FONT = os.getenv("WATERMARK_FONT", "DejaVuSans.ttf")
+# Rendered overlays survive restarts here; the file name changes with the
+# logo and the settings above, so a stale one is never picked up
+WATERMARK_CACHE_DIR = Path(os.getenv("WATERMARK_CACHE_DIR") or Path(tempfile.gettempdir()) / "unipost-watermark")
+
+
+def _render(scale: float) -> Image.Image:
+    """
+    The logo and text as one RGBA image, laid out against an image's
+    bottom-right corner: the logo 20px from the right and 60px from the
+    bottom, the text 20px from the right and from the bottom.
+    """
+    def px(value):
+        return max(1, round(value * scale))
+
+    logo = Image.open(LOGO_PATH).convert("RGBA")
+    logo_w = px(WATERMARK_LOGO_WIDTH)
+    logo_h = max(1, round(logo.height * logo_w / logo.width))
+    logo = logo.resize((logo_w, logo_h), Image.BICUBIC)
+    logo.putalpha(logo.getchannel("A").point(lambda a: round(a * WATERMARK_OPACITY)))
+
+    try:
+        font = ImageFont.truetype(WATERMARK_FONT, px(WATERMARK_FONT_SIZE))
+    except OSError:
+        font = ImageFont.load_default(size=px(WATERMARK_FONT_SIZE))
+    left, top, right, bottom = font.getbbox(WATERMARK_TEXT)
+    text_w, text_h = right - left, bottom - top
+
+    width = max(logo.width, text_w) + px(20)
+    height = max(logo.height + px(60), text_h + px(20))
+    overlay = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    overlay.alpha_composite(logo, (width - logo.width - px(20), height - logo.height - px(60)))
+
+    text_mask = Image.new("L", (width, height), 0)
+    ImageDraw.Draw(text_mask).text(
+        (width - text_w - px(20) - left, height - text_h - px(20) - top),
+        WATERMARK_TEXT, fill=round(255 * WATERMARK_OPACITY), font=font
+    )
+    text_layer = Image.new("RGBA", (width, height), (255, 255, 255, 0))
+    text_layer.putalpha(text_mask)
+    overlay.alpha_composite(text_layer)
+    return overlay
+
+
+def _cache_key(scale: float) -> str:
+    digest = hashlib.sha1(LOGO_PATH.read_bytes())
+    digest.update(repr((scale, WATERMARK_OPACITY, WATERMARK_LOGO_WIDTH, WATERMARK_TEXT,
+                        WATERMARK_FONT, WATERMARK_FONT_SIZE)).encode())
+    return digest.hexdigest()[:16]
+
+
+_render_lock = threading.Lock()
+_paths = {}  # scale -> overlay file, once rendered
+
+
+def overlay_path(scale: float = 1.0) -> str:
+    """
+    Path of the ready-made RGBA PNG for one resolution class, rendered on
+    first use. Video and photo watermarking both just composite this file
+    against the frame's bottom-right corner.
+
+    Safe to call from the photo render pool: the first render happens under
+    a lock into a private temp file, so nobody ever sees a half-written PNG.
+    A file removed behind our back (tmp cleaners) is rendered again.
+    """
+    path = _paths.get(scale)
+    if path is not None and os.path.exists(path):
+        return path
+
+    with _render_lock:
+        path = WATERMARK_CACHE_DIR / f"overlay-{_cache_key(scale)}.png"
+        if not path.exists():
+            WATERMARK_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            fd, part_path = tempfile.mkstemp(dir=WATERMARK_CACHE_DIR, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    _render(scale).save(f, "PNG")
+                os.replace(part_path, path)
+            except BaseException:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                raise
+            print(f"[Watermark] Rendered overlay {path.name} (scale {scale})")
+        _paths[scale] = str(path)
+        return str(path)
+
+
+@lru_cache(maxsize=None)
+def overlay(scale: float = 1.0) -> Image.Image:
+    """The overlay of overlay_path(), decoded once per process."""
+    with Image.open(overlay_path(scale)) as image:
+        return image.convert("RGBA")
+
+
+def apply(image: Image.Image, scale: float = 1.0) -> Image.Image:
+    """Alpha-blends the overlay into `image` in place and returns it."""
+    stamp = overlay(scale)
+    image.paste(stamp, (image.width - stamp.width, image.height - stamp.height), stamp)
+    return image
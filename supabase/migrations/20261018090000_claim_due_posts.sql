@@ -0,0 +1,41 @@
+-- Scheduler claim step.
+--
+-- Several scheduler processes can run against the same database. Instead of
+-- reading pending rows and flipping them to 'processing' in a second query,
+-- workers call claim_due_posts(), which locks due rows with
+-- FOR UPDATE SKIP LOCKED and marks them as owned by the calling worker in a
+-- single statement. A row can therefore only ever be handed to one worker.
+
+alter table public.posts
+    add column if not exists claimed_by text,
+    add column if not exists lease_expires_at timestamptz;
+
+create index if not exists posts_pending_scheduled_at_idx
+    on public.posts (scheduled_at)
+    where status = 'pending';
+
+create or replace function public.claim_due_posts(
+    p_worker_id text,
+    p_lease_seconds integer default 900,
+    p_limit integer default 10
+)
+returns setof public.posts
+language sql
+as $$
+    update public.posts as p
+       set status = 'processing',
+           claimed_by = p_worker_id,
+           lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+     where p.id in (
+               select id
+                 from public.posts
+                where status = 'pending'
+                  and scheduled_at <= now()
+                order by scheduled_at
+                limit p_limit
+                  for update skip locked
+           )
+ returning p.*;
+$$;
+
+revoke execute on function public.claim_due_posts(text, integer, integer) from public, anon, authenticated;
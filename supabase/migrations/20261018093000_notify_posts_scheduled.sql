@@ -0,0 +1,33 @@
+-- Wake schedulers as soon as a scheduled post is created or changed.
+--
+-- Schedulers LISTEN on the 'posts_scheduled' channel and keep their
+-- in-memory due-queue in sync from these payloads, so a post scheduled a
+-- few seconds out is published on time without waiting for a poll.
+-- Changes that take a post out of 'pending' (claimed, cancelled) are sent
+-- too, so other schedulers can drop it from their queue.
+
+create or replace function public.notify_posts_scheduled()
+returns trigger
+language plpgsql
+as $$
+begin
+    if new.status = 'pending' or (tg_op = 'UPDATE' and old.status = 'pending') then
+        perform pg_notify(
+            'posts_scheduled',
+            json_build_object(
+                'id', new.id,
+                'status', new.status,
+                'scheduled_at', new.scheduled_at
+            )::text
+        );
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists posts_scheduled_notify on public.posts;
+
+create trigger posts_scheduled_notify
+    after insert or update of status, scheduled_at on public.posts
+    for each row
+    execute function public.notify_posts_scheduled();
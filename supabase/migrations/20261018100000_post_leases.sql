@@ -0,0 +1,80 @@
+-- Lease recovery for posts stuck in 'processing'.
+--
+-- A claim now counts as an attempt. While a worker publishes a post it keeps
+-- extending lease_expires_at through renew_post_leases(). If the worker
+-- dies, the lease runs out and requeue_expired_posts() (called by every
+-- scheduler) puts the post back to 'pending', or marks it 'failed' once it
+-- has used up its attempts.
+
+alter table public.posts
+    add column if not exists attempts integer not null default 0;
+
+create index if not exists posts_processing_lease_idx
+    on public.posts (lease_expires_at)
+    where status = 'processing';
+
+create or replace function public.claim_due_posts(
+    p_worker_id text,
+    p_lease_seconds integer default 30,
+    p_limit integer default 10
+)
+returns setof public.posts
+language sql
+as $$
+    update public.posts as p
+       set status = 'processing',
+           claimed_by = p_worker_id,
+           lease_expires_at = now() + make_interval(secs => p_lease_seconds),
+           attempts = p.attempts + 1
+     where p.id in (
+               select id
+                 from public.posts
+                where status = 'pending'
+                  and scheduled_at <= now()
+                order by scheduled_at
+                limit p_limit
+                  for update skip locked
+           )
+ returning p.*;
+$$;
+
+-- Extends the lease of every post the worker is still publishing and
+-- returns the ids it still owns. Ids missing from the result were reaped.
+create or replace function public.renew_post_leases(
+    p_worker_id text,
+    p_post_ids bigint[],
+    p_lease_seconds integer default 30
+)
+returns setof bigint
+language sql
+as $$
+    update public.posts
+       set lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+     where id = any(p_post_ids)
+       and claimed_by = p_worker_id
+       and status = 'processing'
+ returning id;
+$$;
+
+create or replace function public.requeue_expired_posts(
+    p_max_attempts integer default 3
+)
+returns table (id bigint, status text, attempts integer)
+language sql
+as $$
+    update public.posts as p
+       set status = case when p.attempts >= p_max_attempts then 'failed' else 'pending' end,
+           claimed_by = null,
+           lease_expires_at = null
+     where p.id in (
+               select posts.id
+                 from public.posts
+                where posts.status = 'processing'
+                  and posts.lease_expires_at < now()
+                  for update skip locked
+           )
+ returning p.id, p.status, p.attempts;
+$$;
+
+revoke execute on function public.renew_post_leases(text, bigint[], integer) from public, anon, authenticated;
+revoke execute on function public.requeue_expired_posts(integer) from public, anon, authenticated;
@@ -0,0 +1,179 @@
+-- Per-platform fan-out.
+--
+-- Every scheduled post is split into one post_targets row per platform.
+-- Targets are claimed, leased, retried and recorded on their own, so a
+-- TikTok failure only retries TikTok. The posts row becomes a summary:
+-- its status and platform_links are kept in sync from its targets by
+-- sync_post_from_targets().
+--
+-- This supersedes the post-level claim and lease functions.
+
+create table if not exists public.post_targets (
+    id bigint generated by default as identity primary key,
+    post_id bigint not null references public.posts (id) on delete cascade,
+    platform text not null,
+    status text not null default 'pending',
+    attempts integer not null default 0,
+    next_retry_at timestamptz,
+    result_url text,
+    last_error text,
+    claimed_by text,
+    lease_expires_at timestamptz,
+    created_at timestamptz not null default now(),
+    updated_at timestamptz not null default now(),
+    unique (post_id, platform)
+);
+
+alter table public.post_targets enable row level security;
+
+create index if not exists post_targets_pending_idx
+    on public.post_targets (next_retry_at)
+    where status = 'pending';
+
+create index if not exists post_targets_processing_lease_idx
+    on public.post_targets (lease_expires_at)
+    where status = 'processing';
+
+-- Keep posts.status / posts.platform_links in line with the targets.
+create or replace function public.sync_post_from_targets()
+returns trigger
+language plpgsql
+as $$
+declare
+    v_post_id bigint := coalesce(new.post_id, old.post_id);
+begin
+    -- Serialise concurrent target updates of the same post. The aggregate
+    -- below runs as a new statement, so it sees whatever the previous
+    -- holder of this lock committed.
+    perform 1 from public.posts where id = v_post_id for update;
+
+    update public.posts as p
+       set status = agg.status,
+           platform_links = agg.links
+      from (
+               select case
+                          when bool_or(t.status in ('pending', 'processing')) then 'processing'
+                          when bool_and(t.status = 'published') then 'published'
+                          else 'failed'
+                      end as status,
+                      coalesce(
+                          jsonb_object_agg(t.platform, t.result_url) filter (where t.result_url is not null),
+                          '{}'::jsonb
+                      ) as links
+                 from public.post_targets as t
+                where t.post_id = v_post_id
+           ) as agg
+     where p.id = v_post_id;
+
+    return null;
+end;
+$$;
+
+drop trigger if exists post_targets_sync_post on public.post_targets;
+
+create trigger post_targets_sync_post
+    after insert or update of status, result_url on public.post_targets
+    for each row
+    execute function public.sync_post_from_targets();
+
+-- Fans due posts out into targets, then claims up to p_limit targets that
+-- are ready (first attempts and retries whose next_retry_at has passed).
+create or replace function public.claim_due_targets(
+    p_worker_id text,
+    p_lease_seconds integer default 30,
+    p_limit integer default 10
+)
+returns setof public.post_targets
+language plpgsql
+as $$
+begin
+    with due as (
+        select id, platforms
+          from public.posts
+         where status = 'pending'
+           and scheduled_at <= now()
+         order by scheduled_at
+         limit p_limit
+           for update skip locked
+    ),
+    started as (
+        update public.posts
+           set status = 'processing'
+         where id in (select id from due)
+    )
+    insert into public.post_targets (post_id, platform)
+    select due.id, platform
+      from due, unnest(due.platforms) as platform
+        on conflict (post_id, platform) do nothing;
+
+    return query
+    update public.post_targets as t
+       set status = 'processing',
+           claimed_by = p_worker_id,
+           lease_expires_at = now() + make_interval(secs => p_lease_seconds),
+           attempts = t.attempts + 1,
+           updated_at = now()
+     where t.id in (
+               select id
+                 from public.post_targets
+                where status = 'pending'
+                  and (next_retry_at is null or next_retry_at <= now())
+                order by coalesce(next_retry_at, created_at)
+                limit p_limit
+                  for update skip locked
+           )
+ returning t.*;
+end;
+$$;
+
+create or replace function public.renew_target_leases(
+    p_worker_id text,
+    p_target_ids bigint[],
+    p_lease_seconds integer default 30
+)
+returns setof bigint
+language sql
+as $$
+    update public.post_targets
+       set lease_expires_at = now() + make_interval(secs => p_lease_seconds)
+     where id = any(p_target_ids)
+       and claimed_by = p_worker_id
+       and status = 'processing'
+ returning id;
+$$;
+
+create or replace function public.requeue_expired_targets(
+    p_max_attempts integer default 3
+)
+returns table (id bigint, post_id bigint, platform text, status text, attempts integer)
+language sql
+as $$
+    update public.post_targets as t
+       set status = case when t.attempts >= p_max_attempts then 'failed' else 'pending' end,
+           last_error = 'Worker lease expired',
+           claimed_by = null,
+           lease_expires_at = null,
+           updated_at = now()
+     where t.id in (
+               select post_targets.id
+                 from public.post_targets
+                where post_targets.status = 'processing'
+                  and post_targets.lease_expires_at < now()
+                  for update skip locked
+           )
+ returning t.id, t.post_id, t.platform, t.status, t.attempts;
+$$;
+
+revoke execute on function public.claim_due_targets(text, integer, integer) from public, anon, authenticated;
+revoke execute on function public.renew_target_leases(text, bigint[], integer) from public, anon, authenticated;
+revoke execute on function public.requeue_expired_targets(integer) from public, anon, authenticated;
+
+-- Post-level leasing is replaced by the target-level functions above.
+drop function if exists public.claim_due_posts(text, integer, integer);
+drop function if exists public.renew_post_leases(text, bigint[], integer);
+drop function if exists public.requeue_expired_posts(integer);
+drop index if exists public.posts_processing_lease_idx;
+alter table public.posts
+    drop column if exists claimed_by,
+    drop column if exists lease_expires_at,
+    drop column if exists attempts;
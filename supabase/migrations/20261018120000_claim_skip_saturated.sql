@@ -0,0 +1,93 @@
+-- Admission-aware claiming.
+--
+-- A scheduler only claims targets it can start right away. It passes the
+-- users and platforms it has no free slots for, and targets of those posts
+-- are left for later (or for another scheduler). Targets that still can't
+-- start are handed back with release_claimed_targets(), which undoes the
+-- claim without using up an attempt.
+
+drop function if exists public.claim_due_targets(text, integer, integer);
+
+create or replace function public.claim_due_targets(
+    p_worker_id text,
+    p_lease_seconds integer default 30,
+    p_limit integer default 10,
+    p_skip_users text[] default '{}',
+    p_skip_platforms text[] default '{}'
+)
+returns setof public.post_targets
+language plpgsql
+as $$
+begin
+    with due as (
+        select id, platforms
+          from public.posts
+         where status = 'pending'
+           and scheduled_at <= now()
+         order by scheduled_at
+         limit p_limit
+           for update skip locked
+    ),
+    started as (
+        update public.posts
+           set status = 'processing'
+         where id in (select id from due)
+    )
+    insert into public.post_targets (post_id, platform)
+    select due.id, platform
+      from due, unnest(due.platforms) as platform
+        on conflict (post_id, platform) do nothing;
+
+    return query
+    update public.post_targets as t
+       set status = 'processing',
+           claimed_by = p_worker_id,
+           lease_expires_at = now() + make_interval(secs => p_lease_seconds),
+           attempts = t.attempts + 1,
+           updated_at = now()
+     where t.id in (
+               select pt.id
+                 from public.post_targets as pt
+                 join public.posts as p on p.id = pt.post_id
+                where pt.status = 'pending'
+                  and (pt.next_retry_at is null or pt.next_retry_at <= now())
+                  and p.user_id::text <> all(p_skip_users)
+                  -- A post is published as a whole, so one full platform
+                  -- holds back all of its ready targets
+                  and not exists (
+                          select 1
+                            from public.post_targets as busy
+                           where busy.post_id = pt.post_id
+                             and busy.status = 'pending'
+                             and busy.platform = any(p_skip_platforms)
+                      )
+                order by coalesce(pt.next_retry_at, pt.created_at)
+                limit p_limit
+                  for update of pt skip locked
+           )
+ returning t.*;
+end;
+$$;
+
+-- Gives claimed targets back to the queue as if they had never been claimed.
+create or replace function public.release_claimed_targets(
+    p_worker_id text,
+    p_target_ids bigint[]
+)
+returns setof bigint
+language sql
+as $$
+    update public.post_targets
+       set status = 'pending',
+           claimed_by = null,
+           lease_expires_at = null,
+           attempts = greatest(attempts - 1, 0),
+           updated_at = now()
+     where id = any(p_target_ids)
+       and claimed_by = p_worker_id
+       and status = 'processing'
+ returning id;
+$$;
+
+revoke execute on function public.claim_due_targets(text, integer, integer, text[], text[]) from public, anon, authenticated;
+revoke execute on function public.release_claimed_targets(text, bigint[]) from public, anon, authenticated;
@@ -0,0 +1,90 @@
+-- Claim whole posts, and never strand a post without platforms.
+--
+-- p_limit now counts posts: every ready target of up to p_limit posts is
+-- claimed together, so one post's platforms are downloaded and rendered
+-- once instead of once per claim they happened to be split across.
+--
+-- A due post whose platforms array is NULL or empty has no targets, so
+-- sync_post_from_targets() would never settle it. It is marked 'failed'
+-- instead of being left in 'processing' forever.
+
+create or replace function public.claim_due_targets(
+    p_worker_id text,
+    p_lease_seconds integer default 30,
+    p_limit integer default 10,
+    p_skip_users text[] default '{}',
+    p_skip_platforms text[] default '{}'
+)
+returns setof public.post_targets
+language plpgsql
+as $$
+begin
+    with due as (
+        select id, platforms
+          from public.posts
+         where status = 'pending'
+           and scheduled_at <= now()
+         order by scheduled_at
+         limit p_limit
+           for update skip locked
+    ),
+    empty as (
+        update public.posts
+           set status = 'failed'
+         where id in (select id from due where coalesce(cardinality(platforms), 0) = 0)
+    ),
+    started as (
+        update public.posts
+           set status = 'processing'
+         where id in (select id from due where cardinality(platforms) > 0)
+    )
+    insert into public.post_targets (post_id, platform)
+    select due.id, platform
+      from due, unnest(due.platforms) as platform
+        on conflict (post_id, platform) do nothing;
+
+    return query
+    with ready as (
+        select pt.id, pt.post_id, coalesce(pt.next_retry_at, pt.created_at) as ready_at
+          from public.post_targets as pt
+          join public.posts as p on p.id = pt.post_id
+         where pt.status = 'pending'
+           and (pt.next_retry_at is null or pt.next_retry_at <= now())
+           and p.user_id::text <> all(p_skip_users)
+           -- A post is published as a whole, so one full platform holds
+           -- back all of its ready targets
+           and not exists (
+                   select 1
+                     from public.post_targets as busy
+                    where busy.post_id = pt.post_id
+                      and busy.status = 'pending'
+                      and busy.platform = any(p_skip_platforms)
+               )
+    ),
+    picked as (
+        select post_id
+          from ready
+         group by post_id
+         order by min(ready_at)
+         limit p_limit
+    )
+    update public.post_targets as t
+       set status = 'processing',
+           claimed_by = p_worker_id,
+           lease_expires_at = now() + make_interval(secs => p_lease_seconds),
+           attempts = t.attempts + 1,
+           updated_at = now()
+     where t.id in (
+               select pt.id
+                 from public.post_targets as pt
+                where pt.id in (select id from ready where post_id in (select post_id from picked))
+                  -- Rechecked once the row is locked, in case another
+                  -- scheduler claimed it after our snapshot
+                  and pt.status = 'pending'
+                  for update skip locked
+           )
+ returning t.*;
+end;
+$$;
+
+revoke execute on function public.claim_due_targets(text, integer, integer, text[], text[]) from public, anon, authenticated;